@@ -11,13 +11,14 @@ from pyqtgraph.flowchart import Flowchart, Node
 import numpy as np
 from DIPPID_pyqtnode import DIPPIDNode, BufferNode
 import pyqtgraph.flowchart.library as fclib
-import pandas as pd
 import os
 from sklearn import svm
-from numpy import fromstring
 import time
 import fluidsynth
 from ConvolutionNode import ConvolveNode
+from final_files.GestureStore import GestureStore, WindowCapture, import_csv
+from final_files.GestureClassifier import build_feature_matrix, get_model_cache
+from final_files.GestureClassifier import get_data_directory
 
 '''
 Custom SVM node which can be switched between
@@ -33,7 +34,10 @@ can be defined by a text field in the control pane)
 Prediction: SVM node reads sample in and outputs the predicted category
 as string.
 '''
-# Filename where our gestures are saved
+# Directory of the GestureStore where our gestures are saved,
+# in the data directory (see GestureClassifier.get_data_directory)
+TRAINING_DATA_STORE = "training_data"
+# Filename of the old csv training data, imported into a new store
 TRAINING_DATA_FILE = "training_data.csv"
 
 # The amount of transformed signals from the dippid we use for 1 gesture;
@@ -48,7 +52,8 @@ class Drumkit(QMainWindow):
     def __init__(self):
         super(Drumkit, self).__init__()
         self.__init_ui()
-        self.init_logger(TRAINING_DATA_FILE)
+        self.init_logger(
+            os.path.join(get_data_directory(), TRAINING_DATA_STORE))
         self.init_nodes()
         self.is_predicting = False
         self.prediction_timer = QtCore.QTimer()
@@ -143,7 +148,7 @@ class Drumkit(QMainWindow):
         self.gesture_list_delete_button.clicked.connect(
             self.delete_selected_gesture_from_list)
         self.gesture_list_save_button = QtWidgets.QPushButton("Save Changes")
-        self.gesture_list_save_button.clicked.connect(self.save_changes_to_csv)
+        self.gesture_list_save_button.clicked.connect(self.save_changes)
         self.gesture_list_widget.layout().addWidget(self.gesture_list_list_widget)
         self.gesture_list_widget.layout().addWidget(self.gesture_list_delete_button)
         self.gesture_list_widget.layout().addWidget(self.gesture_list_save_button)
@@ -170,17 +175,18 @@ class Drumkit(QMainWindow):
         self.predict_label.setText(
             f"Gesture: {self.prediction_node0.get_prediction()} + {self.prediction_node1.get_prediction()}")
 
-    def init_logger(self, filename):
-        self.current_filename = filename
-        if os.path.isfile(filename):
-            self.gesture_data = pd.read_csv(filename)
+    def init_logger(self, path):
+        self.current_filename = path
+        if not os.path.isdir(path) and os.path.isfile(TRAINING_DATA_FILE):
+            self.gesture_store = import_csv(TRAINING_DATA_FILE, path)
         else:
-            self.gesture_data = pd.DataFrame(
-                columns=['gestureName', 'frequenciesX', 'frequenciesY', 'frequenciesZ'])
+            self.gesture_store = GestureStore(path, DATA_LENGTH)
 
     def train_button_press(self):
         if self.convolveNode0.get_had_input_yet():
             self.connection_error_label.setText("")
+            # every window of the training period becomes an example
+            self.train_node.start_capture()
             self.training_timer.start(TIME_FOR_DATA)
             self.train_button.setText("Training!")
             self.train_button.setDisabled(True)
@@ -190,47 +196,56 @@ class Drumkit(QMainWindow):
 
     def add_training_data(self):
         self.training_timer.stop()
-        self.gesture_data = self.gesture_data.append(
-            {'gestureName': self.train_name_input.text(),
-             'frequenciesX': self.train_node.get_current_frequencies_as_string("|")[0],
-             'frequenciesY': self.train_node.get_current_frequencies_as_string("|")[1],
-             'frequenciesZ': self.train_node.get_current_frequencies_as_string("|")[2]},
-            ignore_index=True)
-        print(self.gesture_data)
-        self.gesture_data.to_csv(TRAINING_DATA_FILE, header=True, index=False, index_label=False)
+        capture = self.train_node.stop_capture()
+        # appends only the new gestures, nothing is rewritten
+        try:
+            if capture is not None and capture.count > 0:
+                count = capture.save(self.gesture_store,
+                                     self.train_name_input.text())
+                print(f"{count} examples of {capture.seen} windows saved")
+            else:
+                self.gesture_store.append(self.train_name_input.text(),
+                                          self.train_node.current_gesture_x_frequencies,
+                                          self.train_node.current_gesture_y_frequencies,
+                                          self.train_node.current_gesture_z_frequencies)
+        except ValueError as e:
+            print(e)
         self.train_button.setDisabled(False)
         self.train_button.setText("Start Training")
         self.update_gesture_list()
 
     def update_gesture_list(self):
         self.gesture_list_list_widget.clear()
-        self.gesture_list = []
-        for index, row in self.gesture_data.iterrows():
-            self.gesture_list.append(row["gestureName"])
-        self.gesture_list_list_widget.insertItems(0, self.gesture_list)
+        # one entry per gesture name with the number of its examples
+        counts = self.gesture_store.get_gesture_counts()
+        self.gesture_list = list(counts.keys())
+        self.gesture_list_list_widget.insertItems(
+            0, [f"{name} ({count})" for name, count in counts.items()])
         self.update_prediction_node_data()
 
+    # deletes all examples of the selected gesture; they are only marked,
+    # "Save Changes" removes them
     def delete_selected_gesture_from_list(self):
         index = self.gesture_list_list_widget.currentIndex().row()
-        self.gesture_data = self.gesture_data.drop(
-            self.gesture_data.index[index])
-        # print(self.gesture_data)
+        if index == -1:
+            print("no gesture selected")
+            return
+        self.gesture_store.delete_gesture(self.gesture_list[index])
         self.update_gesture_list()
 
-    def save_changes_to_csv(self):
-        self.gesture_data.to_csv(self.current_filename, index=False)
+    def save_changes(self):
+        self.gesture_store.compact()
+        self.update_gesture_list()
 
+    # trains with every stored example, not only one per gesture
     def update_prediction_node_data(self):
-        self.current_training_data_dict = {}
-        for index, row in self.gesture_data.iterrows():
-            gesture_name = row[0]
-            gesture_x_frequencies = fromstring(row[1], sep="|")
-            gesture_y_frequencies = fromstring(row[2], sep="|")
-            gesture_z_frequencies = fromstring(row[3], sep="|")
-            self.current_training_data_dict[gesture_name] = {
-                "x": gesture_x_frequencies, "y": gesture_y_frequencies, "z": gesture_z_frequencies}
-        self.prediction_node0.init_svm_with_data(
-            self.current_training_data_dict)
+        self.prediction_node0.init_svm_with_examples(
+            *self.gesture_store.get_examples())
+
+    def closeEvent(self, event):
+        # writes the gestures not synced yet
+        self.gesture_store.close()
+        super(Drumkit, self).closeEvent(event)
 
     def init_nodes(self):
         # create buffer nodes
@@ -312,11 +327,13 @@ class PredictionNode(Node):
         self.current_gesture_z_frequencies = []
         self.current_prediction = "None"
         self.training_data_dict = {}
+        self.gesture_names = []
 
     def init_svm_with_data(self, data):
         print("initsvm with data")
         # print(data)
         self.training_data_dict = data
+        self.gesture_names = list(data.keys())
         self.classifier = svm.SVC()
         categories = []
         training_data = []
@@ -329,29 +346,25 @@ class PredictionNode(Node):
                 current_values_array.append(value.get("y"))
                 current_values_array.append(value.get("z"))
 
-                training_data += self.get_svm_data_array(current_values_array)
+                training_data.extend(self.get_svm_data_array(current_values_array))
 
                 current_index += 1
             self.classifier.fit(training_data, categories)
 
+    # trains with several examples per gesture: rows of x, y and z values
+    # and the index of their gesture name, e.g. GestureStore.get_examples()
+    def init_svm_with_examples(self, gesture_names, labels, rows):
+        print("initsvm with examples")
+        self.gesture_names = list(gesture_names)
+        self.classifier = svm.SVC()
+        if len(set(labels)) > 1:
+            # the SVM is only fitted once for the same examples
+            self.classifier = get_model_cache().get_model(labels, rows)
+
+    # feature matrix (1, 3 * DATA_LENGTH): the first DATA_LENGTH x, y and
+    # z values, zero padded if there are less
     def get_svm_data_array(self, x_y_z_array):
-        svm_data_array = []
-        for value in x_y_z_array:
-            x_cut = []
-            for index, x_value in enumerate(x_y_z_array[0]):
-                if index < DATA_LENGTH:
-                    x_cut.append(x_value)
-            y_cut = []
-            for index, y_value in enumerate(x_y_z_array[1]):
-                if index < DATA_LENGTH:
-                    y_cut.append(y_value)
-            z_cut = []
-            for index, z_value in enumerate(x_y_z_array[2]):
-                if index < DATA_LENGTH:
-                    z_cut.append(z_value)
-
-            svm_data_array += x_cut + y_cut + z_cut
-        return [svm_data_array]
+        return build_feature_matrix(*x_y_z_array, length=DATA_LENGTH)
 
     # testing sound accuracy
     def make_sound(self, result):
@@ -367,7 +380,7 @@ class PredictionNode(Node):
         predicition_data = self.get_svm_data_array(input_data)
         result = self.classifier.predict(predicition_data)[0]
         self.make_sound(result)
-        return list(self.training_data_dict.keys())[result]
+        return self.gesture_names[result]
 
     def process(self, **kwds):
         # Get the last values from our accelerator data
@@ -389,6 +402,20 @@ class TrainNode(Node):
         self.current_gesture_x_frequencies = []
         self.current_gesture_y_frequencies = []
         self.current_gesture_z_frequencies = []
+        # WindowCapture collecting every window while capturing
+        self.capture = None
+
+    # from now on every new window is added to capture (a new
+    # WindowCapture by default) until stop_capture()
+    def start_capture(self, capture=None):
+        self.capture = capture if capture is not None else WindowCapture(DATA_LENGTH)
+        self.capture.clear()
+        return self.capture
+
+    def stop_capture(self):
+        capture = self.capture
+        self.capture = None
+        return capture
 
     def get_current_frequencies_as_string(self, seperator):
         current_frequency_strings = []
@@ -405,6 +432,10 @@ class TrainNode(Node):
         self.current_gesture_x_frequencies = kwds["accelerator_x"]
         self.current_gesture_y_frequencies = kwds["accelerator_y"]
         self.current_gesture_z_frequencies = kwds["accelerator_z"]
+        if self.capture is not None:
+            self.capture.add(self.current_gesture_x_frequencies,
+                             self.current_gesture_y_frequencies,
+                             self.current_gesture_z_frequencies)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+import numpy as np
+
+'''
+Input handling of the streaming processing nodes (ConvolveNode,
+FftNode, GoertzelNode and their 3-axis variants).
+
+Their engines keep their own history, so every input sample must be
+passed to them exactly once. A node gets its samples in one of two ways:
+
+    chunks: the samples that arrived since the last propagation, as the
+    DIPPID node outputs them; all of them are new.
+
+    windows of a Buffer node: the Buffer's "total" output has to be
+    connected to the node's "total" input. The node takes the
+    total - (total of the last propagation) newest samples of the
+    window, so no sample of a chunk is lost or processed twice.
+'''
+
+
+class ChunkedInput():
+    def __init__(self):
+        # sample count of the Buffer node at the last call
+        self._total = None
+
+    # index of the first new sample of an input of length samples
+    def _start(self, length, total):
+        if total is None:
+            return 0
+        last = self._total
+        self._total = total
+        new = total if last is None else total - last
+        # more new samples than the window holds were lost in the buffer
+        return max(length - new, 0)
+
+    # the new samples, shape (n, 3), of an (n, 3) input;
+    # total: the sample count of the Buffer node the input is a window of
+    def new_samples(self, samples, total=None):
+        if samples is None:
+            return np.zeros((0, 3))
+        samples = np.asarray(samples)
+        return samples[self._start(len(samples), total):]
+
+    # the new samples, shape (n, 3), of one input per axis
+    def new_axis_samples(self, x, y, z, total=None):
+        if x is None or y is None or z is None:
+            return np.zeros((0, 3))
+        start = self._start(len(x), total)
+        return np.column_stack((x[start:], y[start:], z[start:]))
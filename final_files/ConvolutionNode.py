@@ -5,8 +5,12 @@
 
 from pyqtgraph.flowchart import Flowchart, Node
 import numpy as np
+from ChunkedInput import ChunkedInput
+from MovingAverage import MovingAverage
 
 DATA_LENGTH = 30
+KERNEL_SIZE = 10
+KERNEL_AVG = np.ones(KERNEL_SIZE) / KERNEL_SIZE
 
 # custom FFT node for frequency spectrogram output
 class ConvolveNode(Node):
@@ -17,28 +21,35 @@ class ConvolveNode(Node):
             "accelX": dict(io="in"),
             "accelY": dict(io="in"),
             "accelZ": dict(io="in"),
+            # sample count of the Buffer node the inputs are windows of
+            "total": dict(io="in"),
             "setActive": dict(io="in"),
             "frequencyX": dict(io="out"),
             "frequencyY": dict(io="out"),
             "frequencyZ": dict(io="out"),
         })
+        self._init_state()
+
+    def _init_state(self):
         self.had_input_yet = False
-        self.current_data_x = []
-        self.current_data_y = []
-        self.current_data_z = []
+        # chunks, or windows with the sample count of a Buffer node
+        self._input = ChunkedInput()
+        # streaming mode updates a running sum per sample instead of
+        # convolving the whole window for every sample; both give the same result
+        self.streaming = True
+        # sliding window of the last x/y/z samples with a fixed size
+        self._average = MovingAverage(DATA_LENGTH, KERNEL_SIZE, 3)
 
     # Kernel taken from https://danielmuellerkomorowska.com/
     # 2020/06/02/smoothing-data-by-rolling-average-with-numpy/
     def convolve_signal(self, data):
         try:
-            while len(data) > DATA_LENGTH:
-                data = data[1:]
+            # data is the sliding window, so it never
+            # holds more than DATA_LENGTH samples
             n = len(data)
-            kernel_size = 10
-            kernel_avg = np.ones(kernel_size) / kernel_size
 
             frequenzy = np.abs(np.convolve(
-                data, kernel_avg, mode="same"))[0:int(n)]
+                data, KERNEL_AVG, mode="same"))[0:int(n)]
             # tolist() to convert from np.ndarray
             return frequenzy.tolist()
         except Exception as e:
@@ -49,13 +60,49 @@ class ConvolveNode(Node):
 
     def process(self, **kwds):
         self.had_input_yet = True
-        self.current_data_x.append(kwds["accelX"][-1])
-        self.current_data_y.append(kwds["accelY"][-1])
-        self.current_data_z.append(kwds["accelZ"][-1])
-        x_frequency = self.convolve_signal(self.current_data_x)
-        y_frequency = self.convolve_signal(self.current_data_y)
-        z_frequency = self.convolve_signal(self.current_data_z)
+        self._average.extend(self._input.new_axis_samples(
+            kwds["accelX"], kwds["accelY"], kwds["accelZ"], kwds["total"]))
+
+        if self.streaming:
+            average = self._average.output()
+            # copies, the engine reuses its output array
+            return {'frequencyX': average[:, 0].copy(),
+                    'frequencyY': average[:, 1].copy(),
+                    'frequencyZ': average[:, 2].copy()}
+
+        window = self._average.window()
+        x_frequency = self.convolve_signal(window[:, 0])
+        y_frequency = self.convolve_signal(window[:, 1])
+        z_frequency = self.convolve_signal(window[:, 2])
 
         return {'frequencyX': np.array(x_frequency),
                 'frequencyY': np.array(y_frequency),
                 'frequencyZ': np.array(z_frequency)}
+
+
+# ConvolveNode with one terminal for all axes: "accel" takes (n, 3) samples,
+# "frequency" outputs the (n, 3) float32 moving average
+class ConvolveNode3(ConvolveNode):
+    nodeName = "ConvolveNode3"
+
+    def __init__(self, name):
+        Node.__init__(self, name, terminals={
+            "accel": dict(io="in"),
+            "total": dict(io="in"),
+            "setActive": dict(io="in"),
+            "frequency": dict(io="out"),
+        })
+        self._init_state()
+
+    def process(self, **kwds):
+        self.had_input_yet = True
+        self._average.extend(
+            self._input.new_samples(kwds["accel"], kwds["total"]))
+
+        if self.streaming:
+            frequency = self._average.output()
+        else:
+            window = self._average.window()
+            frequency = np.column_stack(
+                [self.convolve_signal(window[:, axis]) for axis in range(3)])
+        return {'frequency': frequency.astype(np.float32)}
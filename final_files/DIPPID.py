@@ -1,9 +1,16 @@
 import sys
+import os
 import json
-from threading import Thread
-from time import sleep
+import struct
+import mmap
+from threading import Thread, Lock, Condition
+from time import sleep, monotonic
 from datetime import datetime
+from operator import itemgetter
+from array import array
+from collections import OrderedDict
 import signal
+import numpy as np
 
 # those modules are imported dynamically during runtime
 # they are imported only if the corresponding class is used
@@ -11,6 +18,139 @@ import signal
 #import serial
 #import wiimote
 
+# number of samples kept per capability
+HISTORY_SIZE = 1024
+
+# Compact binary packets, accepted next to JSON by every SensorUDP.
+# Little endian, 30 bytes per packet:
+#   2 bytes  magic b'\xffD' (0xff never occurs in UTF-8 / JSON text)
+#   uint8    format version (BINARY_VERSION)
+#   1 byte   padding
+#   uint32   sequence number, incremented per packet (wraps around)
+#   float64  device timestamp in seconds
+#   3 float32 accelerometer x, y, z
+#   uint16   button states, bit 0 is button_1
+# They update the same capabilities as the JSON packets
+# ('accelerometer' and 'button_1' .. 'button_N').
+BINARY_MAGIC = b'\xffD'
+BINARY_VERSION = 1
+BINARY_PACKET = struct.Struct('<2sBxIdfffH')
+BINARY_BUTTONS = 4
+BINARY_BUTTON_KEYS = [f'button_{i + 1}' for i in range(BINARY_BUTTONS)]
+ACCELEROMETER_FIELDS = ['x', 'y', 'z']
+
+# number of capabilities with undelivered changes a CallbackDispatcher holds
+DISPATCH_QUEUE_SIZE = 256
+
+# seconds a receive thread waits for data before checking if it should stop
+RECEIVE_TIMEOUT = 0.5
+
+
+# bounded history of timestamped samples of one capability.
+# Only the receive thread writes, readers never block it:
+# a sample is written first and published by incrementing the
+# counter afterwards. Readers remember the counter (cursor) and
+# ask for all samples written since.
+class SampleHistory():
+
+    def __init__(self, fields, size=HISTORY_SIZE):
+        # names of the values of a sample, e.g. ['x', 'y', 'z'],
+        # or None for capabilities with a single value
+        self.fields = fields
+        self._size = size
+        # one spare slot for the sample that is currently written
+        self._slots = size + 1
+        self._width = len(fields) if fields else 1
+        # the receive thread writes single elements of plain arrays
+        # (much cheaper than numpy item assignment), readers use
+        # numpy views of the same memory
+        self._timestamp_buffer = array('d', bytes(8 * self._slots))
+        self._value_buffer = array('d', bytes(8 * self._slots * self._width))
+        self._timestamps = np.frombuffer(self._timestamp_buffer)
+        self._values = np.frombuffer(self._value_buffer).reshape(
+            self._slots, self._width)
+        self._written = 0
+
+    # values: a number or a tuple with one number per field
+    def append_values(self, timestamp, values):
+        index = self._written % self._slots
+        self._timestamp_buffer[index] = timestamp
+        buffer = self._value_buffer
+        width = self._width
+        if width == 1:
+            buffer[index] = values
+        elif width == 3:
+            base = 3 * index
+            buffer[base] = values[0]
+            buffer[base + 1] = values[1]
+            buffer[base + 2] = values[2]
+        else:
+            base = width * index
+            buffer[base:base + width] = array('d', values)
+        self._written += 1
+
+    def append(self, timestamp, value):
+        if self.fields is None:
+            self.append_values(timestamp, value)
+        else:
+            self.append_values(timestamp,
+                               [value[field] for field in self.fields])
+
+    def get_cursor(self):
+        return self._written
+
+    # returns (timestamps, values, cursor) of all samples written after
+    # cursor that are still available; pass the returned cursor to the
+    # next call. values has one row per sample and one column per field.
+    def get_since(self, cursor):
+        written = self._written
+        start = max(cursor, written - self._size)
+        indices = np.arange(start, written) % self._slots
+        timestamps = self._timestamps[indices]
+        values = self._values[indices]
+
+        # drop samples the writer overwrote (or is writing) while copying
+        overwritten = self._written - self._size - start
+        if overwritten > 0:
+            timestamps = timestamps[overwritten:]
+            values = values[overwritten:]
+        return timestamps, values, written
+
+
+# reads the numbers of a sample as a tuple (or a single number),
+# raises KeyError, TypeError or ValueError if the sample has another format
+def _sample_reader(fields):
+    if fields is None:
+        return float
+    count = len(fields)
+    get = itemgetter(*fields)
+
+    def read(value):
+        if len(value) != count:
+            raise KeyError(fields)
+        return get(value) if count > 1 else (get(value),)
+    return read
+
+
+# per capability state of the fast decode path
+class _SchemaEntry():
+    def __init__(self, key, history, value):
+        self.key = key
+        self.history = history
+        self.read = _sample_reader(history.fields)
+        self.last = self.read(value)
+
+
+# builds a binary packet; buttons are the states of button_1, button_2, ...
+def encode_binary_packet(sequence, device_time, accelerometer, buttons=()):
+    mask = 0
+    for i, state in enumerate(buttons):
+        if state:
+            mask |= 1 << i
+    x, y, z = accelerometer
+    return BINARY_PACKET.pack(BINARY_MAGIC, BINARY_VERSION,
+                              sequence & 0xffffffff, device_time, x, y, z, mask)
+
 
 class Sensor():
     # class variable that stores all instances of Sensor
@@ -23,6 +163,22 @@ class Sensor():
         self._callbacks = {}
         # for each capability, store the last value as an object
         self._data = {}
+        # for each numeric capability, store the last samples with timestamps
+        self._history = {}
+        # decode packets with the same keys as the first one
+        # without the generic per key handling
+        self.fast_decode = True
+        self._schema_keys = None
+        self._schema = []
+        # sequence numbers of binary packets, see get_packet_stats()
+        self._last_sequence = None
+        self._packets_received = 0
+        self._packets_lost = 0
+        self._packets_late = 0
+        self._device_time = None
+        self._recorder = None
+        # delivers callbacks outside of the receive thread if set
+        self._dispatcher = None
         self._receiving = False
         Sensor.instances.append(self)
 
@@ -34,6 +190,35 @@ class Sensor():
         if self._connection_thread:
             self._connection_thread.join()
 
+    # writes every received datagram to recorder (a FrameRecorder),
+    # None stops recording
+    def set_recorder(self, recorder):
+        self._recorder = recorder
+
+    # a datagram is a JSON text or a binary packet (BINARY_PACKET)
+    def _receive_datagram(self, data):
+        if self._recorder is not None:
+            self._recorder.write(data)
+        if data[:2] == BINARY_MAGIC:
+            self._update_binary(data)
+            return
+        try:
+            data_decoded = data.decode()
+        except UnicodeDecodeError:
+            return
+        self._update(data_decoded)
+
+    # called by the multiplexer with all datagrams that were pending
+    def _receive_batch(self, datagrams):
+        if all(data[:2] == BINARY_MAGIC for data in datagrams):
+            if self._recorder is not None:
+                for data in datagrams:
+                    self._recorder.write(data)
+            self._update_binary_batch(datagrams)
+            return
+        for data in datagrams:
+            self._receive_datagram(data)
+
     # runs as a thread
     # receives json formatted data from sensor,
     # stores it and notifies callbacks
@@ -43,9 +228,17 @@ class Sensor():
         except json.decoder.JSONDecodeError:
             # incomplete data
             return
+        if not isinstance(data_json, dict):
+            return
+
+        timestamp = monotonic()
+        if self.fast_decode and data_json.keys() == self._schema_keys:
+            if self._update_fast(data_json, timestamp):
+                return
 
         for key, value in data_json.items():
             self._add_capability(key)
+            self._record(key, value, timestamp)
 
             # do not notify callbacks on initialization
             if self._data[key] == []:
@@ -57,12 +250,123 @@ class Sensor():
                 self._data[key] = value
                 self._notify_callbacks(key)
 
+        if self.fast_decode:
+            self._learn_schema(data_json)
+
+    # remembers the keys of a packet if all of its values are numeric,
+    # following packets with the same keys use _update_fast()
+    def _learn_schema(self, data_json):
+        if data_json.keys() == self._schema_keys:
+            return
+        schema = []
+        try:
+            for key, value in data_json.items():
+                history = self._history.get(key)
+                if history is None:
+                    return
+                schema.append(_SchemaEntry(key, history, value))
+        except (KeyError, TypeError, ValueError):
+            return
+        self._schema = schema
+        self._schema_keys = set(data_json.keys())
+
+    # reads the numbers of every capability straight into its history and
+    # detects changes by comparing numbers instead of the decoded objects.
+    # returns False, without changing anything, if the packet does not
+    # match the learned schema
+    def _update_fast(self, data_json, timestamp):
+        samples = []
+        try:
+            for entry in self._schema:
+                samples.append(entry.read(data_json[entry.key]))
+        except (KeyError, TypeError, ValueError):
+            return False
+
+        for entry, sample in zip(self._schema, samples):
+            entry.history.append_values(timestamp, sample)
+            if sample != entry.last:
+                entry.last = sample
+                self._data[entry.key] = data_json[entry.key]
+                self._notify_callbacks(entry.key)
+        return True
+
+    # decodes one binary packet, see BINARY_PACKET
+    def _update_binary(self, data):
+        if len(data) != BINARY_PACKET.size:
+            return
+        self._update_binary_packet(BINARY_PACKET.unpack(data), monotonic())
+
+    # decodes several binary packets of one receive batch at once
+    def _update_binary_batch(self, datagrams):
+        packets = [data for data in datagrams if len(data) == BINARY_PACKET.size]
+        timestamp = monotonic()
+        for packet in BINARY_PACKET.iter_unpack(b''.join(packets)):
+            self._update_binary_packet(packet, timestamp)
+
+    def _update_binary_packet(self, packet, timestamp):
+        magic, version, sequence, device_time, x, y, z, buttons = packet
+        if version != BINARY_VERSION:
+            return
+        self._count_sequence(sequence)
+        self._device_time = device_time
+        self._store_sample('accelerometer', ACCELEROMETER_FIELDS,
+                           (x, y, z), timestamp)
+        for i, key in enumerate(BINARY_BUTTON_KEYS):
+            self._store_sample(key, None, (buttons >> i) & 1, timestamp)
+
+    # counts lost and late packets from the sequence numbers
+    def _count_sequence(self, sequence):
+        self._packets_received += 1
+        if self._last_sequence is None:
+            self._last_sequence = sequence
+            return
+        # distance to the expected sequence number, modulo 2^32
+        gap = (sequence - self._last_sequence - 1) & 0xffffffff
+        if gap < 0x80000000:
+            self._packets_lost += gap
+            self._last_sequence = sequence
+        else:
+            # arrived after a newer packet, it was counted as lost before
+            self._packets_late += 1
+            if self._packets_lost > 0:
+                self._packets_lost -= 1
+
+    # stores a decoded sample and notifies callbacks if it changed
+    def _store_sample(self, key, fields, sample, timestamp):
+        history = self._history.get(key)
+        if history is None:
+            self._add_capability(key)
+            history = SampleHistory(fields)
+            self._history[key] = history
+        history.append_values(timestamp, sample)
+
+        value = dict(zip(fields, sample)) if fields else sample
+        if self._data[key] == []:
+            self._data[key] = value
+        elif self._data[key] != value:
+            self._data[key] = value
+            self._notify_callbacks(key)
+
+    # statistics of the binary packets received so far:
+    # received, lost (missing sequence numbers), late (out of order)
+    # and loss (lost / sent)
+    def get_packet_stats(self):
+        sent = self._packets_received + self._packets_lost
+        return {'received': self._packets_received,
+                'lost': self._packets_lost,
+                'late': self._packets_late,
+                'loss': self._packets_lost / sent if sent else 0.0}
+
+    # timestamp sent by the device with the last binary packet
+    def get_device_time(self):
+        return self._device_time
+
     # checks if capability is available
     def has_capability(self, key):
-        return key in self._capabilities
+        return key in self._callbacks
 
     def _add_capability(self, key):
-        if not self.has_capability(key):
+        if key not in self._callbacks:
             self._capabilities.append(key)
             self._callbacks[key] = []
             self._data[key] = []
@@ -80,6 +384,60 @@ class Sensor():
             #raise KeyError(f'"{key}" is not a capability of this sensor.')
             return None
 
+    # stores every sample of numeric capabilities in their history
+    def _record(self, key, value, timestamp):
+        history = self._history.get(key)
+        if history is None:
+            if isinstance(value, dict):
+                fields = list(value.keys())
+                numeric = all(isinstance(v, (int, float)) for v in value.values())
+            else:
+                fields = None
+                numeric = isinstance(value, (int, float))
+            if not numeric:
+                return
+            history = SampleHistory(fields)
+            self._history[key] = history
+        try:
+            history.append(timestamp, value)
+        except (KeyError, TypeError, ValueError):
+            # sample does not match the format of the first one
+            pass
+
+    # number of samples received so far for specified capability;
+    # can be used as cursor for get_samples_since()
+    def get_cursor(self, key):
+        history = self._history.get(key)
+        if history is None:
+            return 0
+        return history.get_cursor()
+
+    # get all samples of specified capability received after cursor
+    # as (timestamps, values, cursor), see SampleHistory.get_since()
+    def get_samples_since(self, key, cursor=0):
+        history = self._history.get(key)
+        if history is None:
+            return np.zeros(0), np.zeros((0, self._get_width(key))), cursor
+        return history.get_since(cursor)
+
+    # number of values per sample of a capability without history:
+    # the fields of its last value if it has some, else x, y and z
+    def _get_width(self, key):
+        value = self._data.get(key)
+        if isinstance(value, dict):
+            return len(value)
+        if isinstance(value, (int, float)):
+            return 1
+        return len(ACCELEROMETER_FIELDS)
+
+    # names of the values in a sample of specified capability
+    # (e.g. ['x', 'y', 'z']) or None for single values
+    def get_sample_fields(self, key):
+        history = self._history.get(key)
+        if history is None:
+            return None
+        return history.fields
+
     # register a callback function for a change in specified capability
     def register_callback(self, key, func):
         self._add_capability(key)
@@ -87,17 +445,125 @@ class Sensor():
 
     # remove already registered callback function for specified capability
     def unregister_callback(self, key, func):
-        if key in self._callbacks:
+        if key in self._callbacks and func in self._callbacks[key]:
             self._callbacks[key].remove(func)
             return True
         else:
             # in case somebody wants to check if the callback was present before
             return False
 
+    # callbacks are called by dispatcher (a CallbackDispatcher) instead of
+    # the receive thread, None calls them directly again
+    def set_dispatcher(self, dispatcher):
+        self._dispatcher = dispatcher
+
     def _notify_callbacks(self, key):
-        for func in self._callbacks[key]:
+        callbacks = self._callbacks[key]
+        if not callbacks:
+            return
+        if self._dispatcher is not None:
+            self._dispatcher.post(self, key, self._data[key])
+            return
+        for func in callbacks:
             func(self._data[key])
 
+
+# Calls the callbacks of sensors outside of their receive threads,
+# so slow callbacks can not hold up receiving.
+# Changes wait in a bounded queue with one entry per sensor and capability:
+# a newer value replaces a pending older one (coalesced), only the
+# latest value is delivered. If size capabilities are pending, the oldest
+# change is dropped.
+# threaded: deliver on a worker thread of the dispatcher.
+# Otherwise the owner calls drain(), e.g. from its event loop; notify is
+# called (on the receive thread) when the first change is pending.
+
+
+class CallbackDispatcher():
+    def __init__(self, size=DISPATCH_QUEUE_SIZE, threaded=True, notify=None):
+        self._size = size
+        self._notify = notify
+        # (sensor, key) -> latest value
+        self._pending = OrderedDict()
+        self._condition = Condition(Lock())
+        self._posted = 0
+        self._delivered = 0
+        self._coalesced = 0
+        self._dropped = 0
+        self._max_depth = 0
+        self._running = threaded
+        self._thread = None
+        if threaded:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    # called by the receive threads, never waits for callbacks
+    def post(self, sensor, key, value):
+        with self._condition:
+            self._posted += 1
+            pending = self._pending
+            was_empty = not pending
+            if (sensor, key) in pending:
+                self._coalesced += 1
+            elif len(pending) >= self._size:
+                pending.popitem(last=False)
+                self._dropped += 1
+            pending[(sensor, key)] = value
+            self._max_depth = max(self._max_depth, len(pending))
+            if was_empty:
+                self._condition.notify()
+        if was_empty and self._notify is not None:
+            self._notify()
+
+    # calls the callbacks of all pending changes,
+    # returns the number of delivered changes
+    def drain(self):
+        with self._condition:
+            pending = self._pending
+            self._pending = OrderedDict()
+        for (sensor, key), value in pending.items():
+            for func in list(sensor._callbacks.get(key, ())):
+                try:
+                    func(value)
+                except Exception as e:
+                    print(f'callback for {key} failed: {e}')
+        with self._condition:
+            self._delivered += len(pending)
+        return len(pending)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait()
+                if not self._running:
+                    return
+            self.drain()
+
+    # stops the worker thread, pending changes are not delivered
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    # number of changes waiting for delivery
+    def get_depth(self):
+        return len(self._pending)
+
+    # counters since creation: posted changes, delivered changes,
+    # coalesced (replaced by a newer value), dropped (queue full),
+    # the current and the maximal queue depth
+    def get_stats(self):
+        with self._condition:
+            return {'posted': self._posted,
+                    'delivered': self._delivered,
+                    'coalesced': self._coalesced,
+                    'dropped': self._dropped,
+                    'depth': len(self._pending),
+                    'max_depth': self._max_depth}
+
 # sensor connected via WiFi/UDP
 # initialized with a UDP port
 # listens to all IPs by default
@@ -105,10 +571,14 @@ class Sensor():
 
 
 class SensorUDP(Sensor):
-    def __init__(self, port, ip='0.0.0.0'):
+    # multiplexer: a UDPMultiplexer that receives for this sensor
+    # instead of a thread of its own, see get_udp_multiplexer()
+    def __init__(self, port, ip='0.0.0.0', multiplexer=None):
         Sensor.__init__(self)
         self._ip = ip
         self._port = port
+        self._multiplexer = multiplexer
+        self._connection_thread = None
         self._connect()
 
     def _connect(self):
@@ -116,18 +586,127 @@ class SensorUDP(Sensor):
 
         self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self._sock.bind((self._ip, self._port))
+        if self._multiplexer is not None:
+            self._receiving = True
+            self._multiplexer.add(self)
+            return
         self._connection_thread = Thread(target=self._receive)
         self._connection_thread.start()
 
+    def disconnect(self):
+        if self._multiplexer is not None:
+            self._multiplexer.remove(self)
+        Sensor.disconnect(self)
+
     def _receive(self):
+        import socket
+
         self._receiving = True
+        # wake up regularly, so disconnect() can stop the thread
+        self._sock.settimeout(RECEIVE_TIMEOUT)
         while self._receiving:
-            data, addr = self._sock.recvfrom(1024)
             try:
-                data_decoded = data.decode()
-            except UnicodeDecodeError:
+                data, addr = self._sock.recvfrom(1024)
+            except socket.timeout:
                 continue
-            self._update(data_decoded)
+            self._receive_datagram(data)
+        self._sock.close()
+
+
+
+# receives for any number of SensorUDP instances in a single thread.
+# The thread waits on all sockets with a selector and on each wakeup
+# reads every pending datagram of a ready socket before handing them
+# to the sensor as one batch.
+# requires the selectors and socket modules
+
+
+class UDPMultiplexer():
+    def __init__(self):
+        import selectors
+        import socket
+
+        self._selectors = selectors
+        self._selector = selectors.DefaultSelector()
+        # sockets are (un)registered by the receive thread only,
+        # other threads queue the change and wake the thread up
+        self._changes = []
+        self._lock = Lock()
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._selector.register(self._wakeup_recv, selectors.EVENT_READ)
+        self._sensors = 0
+        self._thread = None
+
+    def add(self, sensor):
+        sensor._sock.setblocking(False)
+        with self._lock:
+            self._changes.append((True, sensor))
+            if self._thread is None:
+                self._thread = Thread(target=self._receive)
+                self._thread.start()
+        self._wakeup_send.send(b'\0')
+
+    def remove(self, sensor):
+        with self._lock:
+            self._changes.append((False, sensor))
+        self._wakeup_send.send(b'\0')
+
+    # number of sensors served by the receive thread
+    def get_sensor_count(self):
+        return self._sensors
+
+    def _apply_changes(self):
+        try:
+            while self._wakeup_recv.recv(1024):
+                pass
+        except BlockingIOError:
+            pass
+        with self._lock:
+            changes = self._changes
+            self._changes = []
+        for add, sensor in changes:
+            if add:
+                self._selector.register(
+                    sensor._sock, self._selectors.EVENT_READ, sensor)
+                self._sensors += 1
+            else:
+                self._selector.unregister(sensor._sock)
+                sensor._sock.close()
+                self._sensors -= 1
+
+    def _receive(self):
+        while True:
+            for key, events in self._selector.select():
+                sensor = key.data
+                if sensor is None:
+                    self._apply_changes()
+                    continue
+                datagrams = []
+                while True:
+                    try:
+                        data, addr = key.fileobj.recvfrom(1024)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    datagrams.append(data)
+                if datagrams:
+                    sensor._receive_batch(datagrams)
+            # stop when the last sensor is gone, add() starts a new thread
+            with self._lock:
+                if self._sensors == 0 and not self._changes:
+                    self._thread = None
+                    return
+
+
+_udp_multiplexer = None
+
+
+# returns the UDPMultiplexer shared by all sensors of this process
+def get_udp_multiplexer():
+    global _udp_multiplexer
+    if _udp_multiplexer is None:
+        _udp_multiplexer = UDPMultiplexer()
+    return _udp_multiplexer
 
 # sensor connected via serial connection (USB)
 # initialized with a path to a TTY (e.g. /dev/ttyUSB0)
@@ -155,15 +734,111 @@ class SensorSerial(Sensor):
         try:
             while self._receiving:
                 data = self._serial.readline()
-                try:
-                    data_decoded = data.decode()
-                except UnicodeDecodeError:
-                    continue
-                self._update(data)
+                self._receive_datagram(data)
         except:
             # connection lost, try again
             self._connect()
 
+# Recordings are files of the raw datagrams (JSON or binary) a sensor
+# received, each with the time since the start of the recording:
+#   header  8 bytes magic b'DIPPIDRC', uint32 version
+#   frames  float64 seconds, uint32 length, length bytes of the datagram
+# They are replayed with SensorReplay.
+RECORDING_MAGIC = b'DIPPIDRC'
+RECORDING_VERSION = 1
+RECORDING_HEADER = struct.Struct('<8sI')
+FRAME_HEADER = struct.Struct('<dI')
+
+
+# writes datagrams to a recording, used with Sensor.set_recorder()
+class FrameRecorder():
+    def __init__(self, path):
+        self.path = path
+        self.frames = 0
+        self._file = open(path, 'wb')
+        self._file.write(RECORDING_HEADER.pack(RECORDING_MAGIC,
+                                               RECORDING_VERSION))
+        self._lock = Lock()
+        self._start = monotonic()
+
+    def write(self, data):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(FRAME_HEADER.pack(monotonic() - self._start,
+                                               len(data)))
+            self._file.write(data)
+            self.frames += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# yields (seconds, datagram) for every frame of a recording.
+# The file is memory mapped, so it is never read as a whole.
+def read_frames(path):
+    with open(path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as frames:
+            magic, version = RECORDING_HEADER.unpack_from(frames)
+            if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+                raise ValueError(f'{path} is no DIPPID recording')
+            offset = RECORDING_HEADER.size
+            end = len(frames)
+            while offset + FRAME_HEADER.size <= end:
+                time, length = FRAME_HEADER.unpack_from(frames, offset)
+                offset += FRAME_HEADER.size
+                if offset + length > end:
+                    # the recording was cut off while writing this frame
+                    return
+                yield time, frames[offset:offset + length]
+                offset += length
+
+# plays a recording back like a live device
+# speed: 1 plays in real time, 2 twice as fast,
+# None or 0 as fast as possible
+# loop: start again at the end of the recording
+
+
+class SensorReplay(Sensor):
+    def __init__(self, path, speed=1, loop=False):
+        Sensor.__init__(self)
+        self._path = path
+        self._speed = speed
+        self._loop = loop
+        self._connection_thread = None
+        self._connect()
+
+    def _connect(self):
+        self._receiving = True
+        self._connection_thread = Thread(target=self._receive)
+        self._connection_thread.start()
+
+    def _receive(self):
+        while self._receiving:
+            start = monotonic()
+            for time, data in read_frames(self._path):
+                if not self._receiving:
+                    return
+                if self._speed:
+                    delay = start + time / self._speed - monotonic()
+                    if delay > 0:
+                        sleep(delay)
+                self._receive_datagram(data)
+            if not self._loop:
+                break
+        self._receiving = False
+
+    # True once the whole recording was played
+    def is_finished(self):
+        return not self._connection_thread.is_alive()
+
+    # blocks until the whole recording was played
+    def wait(self, timeout=None):
+        self._connection_thread.join(timeout)
+
 # uses a Nintendo Wiimote as a sensor (connected via Bluetooth)
 # initialized with a Bluetooth address
 # requires wiimote.py (https://github.com/RaphaelWimmer/wiimote.py)
@@ -200,6 +875,7 @@ class SensorWiimote(Sensor):
 
     def _update(self, key, value):
         self._add_capability(key)
+        self._record(key, value, monotonic())
 
         # do not notify callbacks on initialization
         if self._data[key] == []:
@@ -211,6 +887,24 @@ class SensorWiimote(Sensor):
             self._data[key] = value
             self._notify_callbacks(key)
 
+# creates the sensor for an address: a path to a TTY (serial),
+# a Bluetooth address (Wiimote), a recording (replayed with speed)
+# or a UDP port. Returns None for an invalid address.
+def create_sensor(address, multiplexer=None, speed=1):
+    address = str(address)
+    # recordings first, their paths may contain ':' (drive letters, times)
+    if os.path.isfile(address):
+        return SensorReplay(address, speed)
+    if '/dev/tty' in address:
+        return SensorSerial(address)
+    if ':' in address:
+        return SensorWiimote(address)
+    if address.isnumeric():
+        return SensorUDP(int(address), multiplexer=multiplexer)
+    print(f'invalid address: {address}')
+    print('allowed types: UDP port, bluetooth address, path to /dev/tty*, recording')
+    return None
+
 # close the program softly when ctrl+c is pressed
 
 
@@ -221,3 +915,17 @@ def handle_interrupt_signal(signal, frame):
 
 
 signal.signal(signal.SIGINT, handle_interrupt_signal)
+
+
+# records a UDP device until ctrl+c is pressed:
+#   python DIPPID.py record PORT FILE
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] != 'record':
+        print(f'usage: {sys.argv[0]} record PORT FILE')
+        sys.exit(1)
+    recorder = FrameRecorder(sys.argv[3])
+    sensor = SensorUDP(int(sys.argv[2]))
+    sensor.set_recorder(recorder)
+    while True:
+        sleep(1)
+        print(f'{recorder.frames} frames recorded')
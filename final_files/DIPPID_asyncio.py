@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+import asyncio
+import sys
+from collections import deque
+from DIPPID import SensorUDP
+
+'''
+asyncio transport for DIPPID devices.
+
+SensorAsyncUDP receives with an asyncio DatagramProtocol instead of a
+thread, so any number of devices can be served by one event loop
+(a plain asyncio loop or a Qt loop like qasync). Samples are consumed
+with async iterators:
+
+    sensor = SensorAsyncUDP(5700)
+    await sensor.connect()
+    async for timestamp, value in sensor.stream('accelerometer'):
+        ...
+    async for batch in sensor.stream('accelerometer').batches(16):
+        ...
+
+Every stream has a bounded queue. If a consumer is too slow the oldest
+samples are dropped (and counted) instead of letting the queue grow.
+'''
+
+# number of samples a stream keeps for a slow consumer
+STREAM_SIZE = 256
+
+
+class DIPPIDProtocol(asyncio.DatagramProtocol):
+    def __init__(self, sensor):
+        self._sensor = sensor
+
+    def datagram_received(self, data, addr):
+        self._sensor._receive_datagram(data)
+
+    def error_received(self, exc):
+        print(f'DIPPID receive error: {exc}')
+
+
+# async iterator over the samples of one capability
+class SensorStream():
+    def __init__(self, sensor, key, size=STREAM_SIZE):
+        self.key = key
+        self.dropped = 0
+        self._sensor = sensor
+        self._samples = deque(maxlen=size)
+        self._waiter = None
+        self._closed = False
+
+    def _put(self, timestamp, value):
+        if len(self._samples) == self._samples.maxlen:
+            self.dropped += 1
+        self._samples.append((timestamp, value))
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def _wait(self):
+        while not self._samples:
+            if self._closed:
+                raise StopAsyncIteration
+            self._waiter = asyncio.get_running_loop().create_future()
+            await self._waiter
+            self._waiter = None
+
+    def close(self):
+        self._closed = True
+        self._sensor._remove_stream(self)
+        self._wake()
+
+    def __aiter__(self):
+        return self
+
+    # next (timestamp, value) pair
+    async def __anext__(self):
+        await self._wait()
+        return self._samples.popleft()
+
+    # all queued samples (at most max_size), waits for at least one
+    async def get_batch(self, max_size=None):
+        await self._wait()
+        count = len(self._samples)
+        if max_size is not None:
+            count = min(count, max_size)
+        return [self._samples.popleft() for i in range(count)]
+
+    async def batches(self, max_size=None):
+        while True:
+            try:
+                yield await self.get_batch(max_size)
+            except StopAsyncIteration:
+                return
+
+
+# sensor connected via WiFi/UDP, received by the running asyncio loop.
+# connect() has to be awaited before data arrives.
+class SensorAsyncUDP(SensorUDP):
+    def __init__(self, port, ip='0.0.0.0'):
+        self._transport = None
+        self._streams = {}
+        SensorUDP.__init__(self, port, ip)
+
+    def _connect(self):
+        # the endpoint is created in connect() on the event loop
+        pass
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        self._transport, protocol = await loop.create_datagram_endpoint(
+            lambda: DIPPIDProtocol(self), local_addr=(self._ip, self._port))
+        self._receiving = True
+
+    def disconnect(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        for streams in list(self._streams.values()):
+            for stream in list(streams):
+                stream.close()
+        SensorUDP.disconnect(self)
+
+    # async iterator over all samples of specified capability
+    # that arrive from now on
+    def stream(self, key, size=STREAM_SIZE):
+        stream = SensorStream(self, key, size)
+        self._streams.setdefault(key, []).append(stream)
+        return stream
+
+    def _remove_stream(self, stream):
+        streams = self._streams.get(stream.key, [])
+        if stream in streams:
+            streams.remove(stream)
+
+    def _record(self, key, value, timestamp):
+        SensorUDP._record(self, key, value, timestamp)
+        for stream in self._streams.get(key, ()):
+            stream._put(timestamp, value)
+
+    # the fast decode path writes the histories without _record()
+    def _update_fast(self, data_json, timestamp):
+        if not SensorUDP._update_fast(self, data_json, timestamp):
+            return False
+        for key, streams in self._streams.items():
+            if key in data_json:
+                for stream in streams:
+                    stream._put(timestamp, data_json[key])
+        return True
+
+    # samples of binary packets
+    def _store_sample(self, key, fields, sample, timestamp):
+        SensorUDP._store_sample(self, key, fields, sample, timestamp)
+        for stream in self._streams.get(key, ()):
+            stream._put(timestamp, self._data[key])
+
+
+# creates and connects sensors for all ports
+async def connect_sensors(ports, ip='0.0.0.0'):
+    sensors = [SensorAsyncUDP(port, ip) for port in ports]
+    await asyncio.gather(*(sensor.connect() for sensor in sensors))
+    return sensors
+
+
+# headless demo: prints the accelerometer sample rate of every port
+async def print_rates(ports):
+    sensors = await connect_sensors(ports)
+
+    async def count(sensor, counts):
+        async for batch in sensor.stream('accelerometer').batches():
+            counts[sensor._port] += len(batch)
+
+    counts = {port: 0 for port in ports}
+    tasks = [asyncio.create_task(count(sensor, counts)) for sensor in sensors]
+    try:
+        while True:
+            await asyncio.sleep(1)
+            print(' '.join(f'{port}: {n}/s' for port, n in counts.items()))
+            for port in counts:
+                counts[port] = 0
+    finally:
+        for sensor in sensors:
+            sensor.disconnect()
+        await asyncio.gather(*tasks)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(f'usage: {sys.argv[0]} PORT [PORT ...]')
+        sys.exit(1)
+    asyncio.run(print_rates([int(port) for port in sys.argv[1:]]))
@@ -9,10 +9,49 @@ import pyqtgraph.flowchart.library as fclib
 from pyqtgraph.Qt import QtGui, QtCore
 import pyqtgraph as pg
 import numpy as np
-from DIPPID import SensorUDP, SensorSerial, SensorWiimote
+from DIPPID import create_sensor, get_udp_multiplexer
+from DIPPID import CallbackDispatcher
 import sys
-from FFTNode import FftNode
+from time import monotonic
+from FFTNode import FftNode, FftNode3
+from GoertzelNode import GoertzelNode, GoertzelNode3
+from FilterNode import FilterNode, FilterNode3
 from ConvolutionNode import ConvolveNode
+from RingBuffer import RingBuffer
+
+
+# upper limit of propagations per second of a DIPPID node in event mode
+MAX_PROPAGATION_RATE = 60
+
+
+class QtCallbackDispatcher(QtCore.QObject):
+    """
+    Delivers DIPPID callbacks on the Qt thread.
+
+    The receive threads only queue changes in a CallbackDispatcher and
+    emit a queued signal once; the Qt event loop then calls all pending
+    callbacks. Qt widgets can be used safely in the callbacks and a busy
+    GUI never holds up receiving.
+    Has to be created on the Qt thread.
+    """
+    pending = QtCore.Signal()
+
+    def __init__(self):
+        QtCore.QObject.__init__(self)
+        self.dispatcher = CallbackDispatcher(threaded=False,
+                                             notify=self.pending.emit)
+        self.pending.connect(self.dispatcher.drain, QtCore.Qt.QueuedConnection)
+
+
+_qt_dispatcher = None
+
+
+# returns the dispatcher shared by all DIPPID nodes
+def get_qt_dispatcher():
+    global _qt_dispatcher
+    if _qt_dispatcher is None:
+        _qt_dispatcher = QtCallbackDispatcher()
+    return _qt_dispatcher.dispatcher
 
 
 class BufferNode(Node):
@@ -21,6 +60,16 @@ class BufferNode(Node):
     them as a list of length n on output.
     A spinbox widget allows for setting the size of the buffer.
     Default size is 32 samples.
+
+    The samples are kept in a preallocated ring buffer, so buffering
+    does not allocate memory. The output is a view into the buffer
+    which is only valid until the next sample arrives; a node that
+    keeps it has to copy it (the processing nodes copy the new samples
+    into their own windows).
+    Input can be single samples, chunks of samples or samples with
+    several channels (shape (n, channels)). float32 input is
+    buffered as float32, everything else is converted to float64
+    when it is written into the buffer.
     """
     nodeName = "Buffer"
 
@@ -28,17 +77,34 @@ class BufferNode(Node):
         terminals = {
             'dataIn': dict(io='in'),
             'dataOut': dict(io='out'),
+            # number of samples received so far, connected to the
+            # "total" input of a processing node it takes exactly
+            # the new samples of the window (see ChunkedInput)
+            'total': dict(io='out'),
         }
 
         self.buffer_size = 32
-        self._buffer = np.array([])
+        self._buffer = None
         Node.__init__(self, name, terminals=terminals)
 
+    # changes the buffer size at runtime without dropping buffered samples
+    def set_buffer_size(self, size):
+        self.buffer_size = int(size)
+        if self._buffer is not None:
+            self._buffer.resize(self.buffer_size)
+
     def process(self, **kwds):
-        self._buffer = np.append(
-            self._buffer, kwds['dataIn'])[-self.buffer_size:]
+        data = np.asarray(kwds['dataIn'])
+        if data.ndim == 0:
+            data = data.reshape(1)
+        if self._buffer is None:
+            channels = data.shape[1] if data.ndim > 1 else None
+            dtype = np.float32 if data.dtype == np.float32 else np.float64
+            self._buffer = RingBuffer(self.buffer_size, channels, dtype)
+        self._buffer.extend(data)
 
-        return {'dataOut': self._buffer}
+        return {'dataOut': self._buffer.window(),
+                'total': self._buffer.get_total()}
 
 
 fclib.registerNodeType(BufferNode, [('Data',)])
@@ -49,11 +115,18 @@ class DIPPIDNode(Node):
     Outputs sensor data from DIPPID supported hardware.
 
     Supported sensors: accelerometer (3 axis)
-    Text input box allows for setting a Bluetooth MAC address or Port.
+    Text input box allows for setting a Bluetooth MAC address or Port
+    (or the path of a recording that is played back instead).
     Pressing the "connect" button tries connecting to the DIPPID device.
     Update rate can be changed via a spinbox widget. Setting it to "0"
-    activates callbacks every time a new sensor value arrives (which is
-    quite often -> performance hit)
+    propagates whenever new sensor values arrive, but at most
+    MAX_PROPAGATION_RATE times per second: the propagation rate follows
+    the device rate up to that limit.
+    Each propagation outputs all samples that arrived since the last one
+    (oldest first), so no sample is lost if the device is faster and
+    nothing is propagated if no new sample arrived.
+    Besides one output per axis, "accel" outputs all axes as one
+    (n, 3) float32 array for the single terminal node variants.
     """
 
     nodeName = "DIPPID"
@@ -63,64 +136,82 @@ class DIPPIDNode(Node):
             'accelX': dict(io='out'),
             'accelY': dict(io='out'),
             'accelZ': dict(io='out'),
+            # all axes at once, shape (n, 3), float32
+            'accel': dict(io='out'),
         }
 
         self.dippid = None
         self._acc_vals = []
+        self._acc_batch = np.zeros((0, 3))
         self._btns = {
             "button1": 0,
             "button2": 0,
             "button3": 0
         }
+        # history cursor of the last propagated accelerometer sample
+        self._cursor = 0
+        self._last_propagation = 0
+        # history index and receive time of the first sample
+        # of the last propagated batch
+        self._batch_start = (-1, None)
 
         self.update_timer = QtCore.QTimer()
         self.update_timer.timeout.connect(self.update_all_sensors)
+        # delays propagation in event mode if the device is faster
+        # than MAX_PROPAGATION_RATE
+        self._event_timer = QtCore.QTimer()
+        self._event_timer.setSingleShot(True)
+        self._event_timer.timeout.connect(self.update_all_sensors)
 
         Node.__init__(self, name, terminals=terminals)
 
+    # propagates all accelerometer samples since the last propagation,
+    # does nothing if there are none
     def update_all_sensors(self):
-        if self.dippid is None or not self.dippid.has_capability('accelerometer'):
-            return
-        if self.dippid is None or not self.dippid.has_capability('button_1'):
-            return
-        if self.dippid is None or not self.dippid.has_capability('button_2'):
+        if self.dippid is None:
             return
-        if self.dippid is None or not self.dippid.has_capability('button_3'):
+        timestamps, values, self._cursor = self.dippid.get_samples_since(
+            'accelerometer', self._cursor)
+        if len(values) == 0 or values.shape[1] != 3:
             return
+        self._batch_start = (self._cursor - len(values), timestamps[0])
+        self._acc_batch = values
+        self._acc_vals = values[-1].tolist()
 
-        v = self.dippid.get_value('accelerometer')
-        self._acc_vals = [v['x'], v['y'], v['z']]
-
-        self._btns["button1"] = int(self.dippid.get_value('button_1'))
-        self._btns["button2"] = int(self.dippid.get_value('button_2'))
-        self._btns["button3"] = int(self.dippid.get_value('button_3'))
+        for i, key in enumerate(('button_1', 'button_2', 'button_3')):
+            value = self.dippid.get_value(key)
+            if value is not None and value != []:
+                self._btns[f"button{i + 1}"] = int(value)
 
+        self._last_propagation = monotonic()
         self.update()
 
+    # history index and (monotonic) receive time of the first sample
+    # of the last propagated batch, used by the LatencyTracer
+    def get_trace(self):
+        return self._batch_start
+
+    # event mode: called (on the Qt thread) when a new value arrived
     def update_accel(self, acc_vals):
-        if not self.dippid.has_capability('accelerometer'):
+        if self._event_timer.isActive():
+            # the samples are propagated with the pending update
             return
-
-        self._acc_vals = [acc_vals['x'], acc_vals['y'], acc_vals['z']]
-        self.update()
+        wait = self._last_propagation + 1 / MAX_PROPAGATION_RATE - monotonic()
+        if wait > 0:
+            self._event_timer.start(int(wait * 1000) + 1)
+            return
+        self.update_all_sensors()
 
     def connect_device(self, port, hz):
-        address = str(port)
-
-        if '/dev/tty' in address:  # serial tty
-            self.dippid = SensorSerial(address)
-        elif ':' in address:
-            self.dippid = SensorWiimote(address)
-        elif address.isnumeric():
-            self.dippid = SensorUDP(int(address))
-        else:
-            print(f'invalid address: {address}')
-            print('allowed types: UDP port, bluetooth address, path to /dev/tty*')
+        # all UDP devices share one receive thread
+        self.dippid = create_sensor(port, multiplexer=get_udp_multiplexer())
 
         if self.dippid is None:
             print("try again")
             return
 
+        # callbacks are called on the Qt thread, not the receive thread
+        self.dippid.set_dispatcher(get_qt_dispatcher())
         self.set_update_rate(hz)
 
     def set_update_rate(self, rate):
@@ -131,6 +222,7 @@ class DIPPIDNode(Node):
 
         if rate == 0:
             self.update_timer.stop()
+            self.dippid.register_callback('accelerometer', self.update_accel)
         else:
             self.update_timer.start(int(1000 / rate))
 
@@ -138,13 +230,19 @@ class DIPPIDNode(Node):
         return self._btns
 
     def process(self, **kwdargs):
-        return {'accelX': np.array([self._acc_vals[0]]),
-                'accelY': np.array([self._acc_vals[1]]),
-                'accelZ': np.array([self._acc_vals[2]])}
+        return {'accelX': self._acc_batch[:, 0],
+                'accelY': self._acc_batch[:, 1],
+                'accelZ': self._acc_batch[:, 2],
+                'accel': self._acc_batch.astype(np.float32)}
 
 
 fclib.registerNodeType(DIPPIDNode, [('Sensor',)])
 fclib.registerNodeType(FftNode, [("FftNode",)])
+fclib.registerNodeType(GoertzelNode, [("GoertzelNode",)])
+fclib.registerNodeType(FilterNode, [("FilterNode",)])
+fclib.registerNodeType(FftNode3, [("FftNode",)])
+fclib.registerNodeType(GoertzelNode3, [("GoertzelNode",)])
+fclib.registerNodeType(FilterNode3, [("FilterNode",)])
 
 # Following functions are for singnal prcoessing visualization
 
@@ -169,7 +267,8 @@ def xPlot(fc, node, dippidNode, xPos):
     pw2Node = fc.createNode('PlotWidget', pos=(0, -300))
     pw2Node.setPlot(pw2)
 
-    fc.connectTerminals(bufferNodeX['dataOut'], node['accelX'])
+    # the processing node takes the chunks of new samples directly
+    fc.connectTerminals(dippidNode['accelX'], node['accelX'])
     fc.connectTerminals(node['frequencyX'], pw2Node['In'])
 
 
@@ -193,7 +292,8 @@ def yPlot(fc, node, dippidNode, xPos):
     pw2Node = fc.createNode('PlotWidget', pos=(0, -300))
     pw2Node.setPlot(pw2)
 
-    fc.connectTerminals(bufferNodeY['dataOut'], node['accelY'])
+    # the processing node takes the chunks of new samples directly
+    fc.connectTerminals(dippidNode['accelY'], node['accelY'])
     fc.connectTerminals(node['frequencyY'], pw2Node['In'])
 
 
@@ -217,7 +317,8 @@ def zPlot(fc, node, dippidNode, xPos):
     pw2Node = fc.createNode('PlotWidget', pos=(0, -300))
     pw2Node.setPlot(pw2)
 
-    fc.connectTerminals(bufferNodeZ['dataOut'], node['accelZ'])
+    # the processing node takes the chunks of new samples directly
+    fc.connectTerminals(dippidNode['accelZ'], node['accelZ'])
     fc.connectTerminals(node['frequencyZ'], pw2Node['In'])
 
 
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+SOUNDFONT = './pns_drum.sf2'
+AUDIO_DRIVER = 'alsa'
+
+
+# fluidsynth drum sounds. The synth (and the audio driver) is only
+# started when the first sound is played, so nodes and pipelines can be
+# created on machines without audio.
+# requires pyfluidsynth
+class DrumSynth():
+    def __init__(self, soundfont=SOUNDFONT, driver=AUDIO_DRIVER):
+        self.soundfont = soundfont
+        self.driver = driver
+        self._fs = None
+
+    def _synth(self):
+        if self._fs is None:
+            import fluidsynth
+
+            fs = fluidsynth.Synth(1)
+            fs.start(driver=self.driver)
+            sfid = fs.sfload(self.soundfont)
+            # select MIDI track, sound font, MIDI bank and preset
+            fs.program_select(0, sfid, 0, 0)
+            self._fs = fs
+        return self._fs
+
+    def play(self, drum, velocity=100):
+        fs = self._synth()
+        fs.noteon(0, drum, velocity)
+        fs.noteoff(0, drum)
+
+    # the next count rendered samples, for recordings
+    def get_samples(self, count):
+        return self._synth().get_samples(count)
+
+
+# converts rendered samples to raw audio bytes
+def raw_audio_string(samples):
+    import fluidsynth
+
+    return fluidsynth.raw_audio_string(samples)
@@ -5,6 +5,8 @@
 
 from pyqtgraph.flowchart import Flowchart, Node
 import numpy as np
+from ChunkedInput import ChunkedInput
+from Spectrum import Stft, SlidingDft
 
 DATA_LENGTH = 60
 
@@ -17,46 +19,68 @@ class FftNode(Node):
             "accelX": dict(io="in"),
             "accelY": dict(io="in"),
             "accelZ": dict(io="in"),
+            # sample count of the Buffer node the inputs are windows of
+            "total": dict(io="in"),
             "setActive": dict(io="in"),
             "frequencyX": dict(io="out"),
             "frequencyY": dict(io="out"),
             "frequencyZ": dict(io="out"),
         })
+        self._init_state()
+
+    def _init_state(self):
         self.had_input_yet = False
-        self.current_data_x = []
-        self.current_data_y = []
-        self.current_data_z = []
-
-    def calculate_frequency(self, data):
-        try:
-            #  we only want to get [DATA_LENGTH] frequencies
-            #  from the last signals. Since our forier
-            #  transformation cuts the data amount throught 2
-            #  we use len(data)/2 for this
-            while len(data)/2 > DATA_LENGTH:
-                data = data[1:]
-            n = len(data)
-            # fft computing and normalization and
-            # use only first half as the function is mirrored
-            frequenzy = np.abs(np.fft.fft(data) / n)[0:int(n / 2)]
-
-            # tolist() to convert from np.ndarray
-            return frequenzy.tolist()
-        except Exception as e:
-            print(e)
+        # chunks, or windows with the sample count of a Buffer node
+        self._input = ChunkedInput()
+        self.set_spectrum_mode()
+
+    # window: "rect", "hann", "hamming" or "blackman"
+    # hop_size: the spectrum is only recomputed every hop_size samples
+    # sliding: update the DFT bins per sample instead of a new FFT
+    # (only "rect" and "hann" windows)
+    def set_spectrum_mode(self, window="rect", hop_size=1, sliding=False):
+        #  we only want to get [DATA_LENGTH] frequencies
+        #  from the last signals. Since our forier
+        #  transformation cuts the data amount throught 2
+        #  the window holds 2 * DATA_LENGTH samples
+        if sliding:
+            self._spectrum = SlidingDft(2 * DATA_LENGTH, 3, window, hop_size)
+        else:
+            self._spectrum = Stft(2 * DATA_LENGTH, 3, window, hop_size)
 
     def get_had_input_yet(self):
         return self.had_input_yet
 
     def process(self, **kwds):
         self.had_input_yet = True
-        self.current_data_x.append(kwds["accelX"][-1])
-        self.current_data_y.append(kwds["accelY"][-1])
-        self.current_data_z.append(kwds["accelZ"][-1])
-        x_frequency = self.calculate_frequency(self.current_data_x)
-        y_frequency = self.calculate_frequency(self.current_data_y)
-        z_frequency = self.calculate_frequency(self.current_data_z)
-
-        return {'frequencyX': np.array(x_frequency),
-                'frequencyY': np.array(y_frequency),
-                'frequencyZ': np.array(z_frequency)}
+        self._spectrum.extend(self._input.new_axis_samples(
+            kwds["accelX"], kwds["accelY"], kwds["accelZ"], kwds["total"]))
+        # fft of all three axes at once, normalized and
+        # only the first half as the function is mirrored
+        frequency = self._spectrum.spectrum()
+
+        # copies, the engine reuses its output array
+        return {'frequencyX': frequency[:, 0].copy(),
+                'frequencyY': frequency[:, 1].copy(),
+                'frequencyZ': frequency[:, 2].copy()}
+
+
+# FftNode with one terminal for all axes: "accel" takes (n, 3) samples,
+# "frequency" outputs the (DATA_LENGTH, 3) float32 spectrum
+class FftNode3(FftNode):
+    nodeName = "FftNode3"
+
+    def __init__(self, name):
+        Node.__init__(self, name, terminals={
+            "accel": dict(io="in"),
+            "total": dict(io="in"),
+            "setActive": dict(io="in"),
+            "frequency": dict(io="out"),
+        })
+        self._init_state()
+
+    def process(self, **kwds):
+        self.had_input_yet = True
+        self._spectrum.extend(
+            self._input.new_samples(kwds["accel"], kwds["total"]))
+        return {'frequency': self._spectrum.spectrum().astype(np.float32)}
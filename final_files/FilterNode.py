@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+from pyqtgraph.flowchart import Flowchart, Node
+import numpy as np
+from IirFilter import IirFilter
+
+# default: remove gravity from a 30 Hz signal
+FILTER_TYPE = "highpass"
+CUTOFF = 0.5
+RATE = 30
+ORDER = 2
+
+
+# filters the raw sensor samples with a streaming butterworth filter
+class FilterNode(Node):
+    """
+    Low-, high- or band-pass filters the x/y/z samples on input and
+    outputs the filtered samples. Each input can hold one or several new
+    samples; the filter state is kept between calls so a sample only
+    costs a few multiply-adds.
+    The rate has to match the update rate of the DIPPID device.
+    """
+    nodeName = "FilterNode"
+
+    def __init__(self, name):
+        Node.__init__(self, name, terminals={
+            "accelX": dict(io="in"),
+            "accelY": dict(io="in"),
+            "accelZ": dict(io="in"),
+            "filteredX": dict(io="out"),
+            "filteredY": dict(io="out"),
+            "filteredZ": dict(io="out"),
+        })
+        self.set_filter()
+
+    # btype: "lowpass", "highpass" or "bandpass" (cutoff = (low, high))
+    def set_filter(self, btype=FILTER_TYPE, cutoff=CUTOFF, rate=RATE,
+                   order=ORDER):
+        self._filter = IirFilter(btype, cutoff, rate, order)
+
+    def process(self, **kwds):
+        samples = np.column_stack(
+            (kwds["accelX"], kwds["accelY"], kwds["accelZ"]))
+        filtered = self._filter.filter(samples)
+
+        return {'filteredX': filtered[:, 0],
+                'filteredY': filtered[:, 1],
+                'filteredZ': filtered[:, 2]}
+
+
+# FilterNode with one terminal for all axes: "accel" takes (n, 3) samples,
+# "filtered" outputs the (n, 3) float32 filtered samples
+class FilterNode3(FilterNode):
+    nodeName = "FilterNode3"
+
+    def __init__(self, name):
+        Node.__init__(self, name, terminals={
+            "accel": dict(io="in"),
+            "filtered": dict(io="out"),
+        })
+        self.set_filter()
+
+    def process(self, **kwds):
+        filtered = self._filter.filter(kwds["accel"])
+        return {'filtered': filtered.astype(np.float32)}
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+import csv
+import hashlib
+import json
+import os
+import pickle
+import numpy as np
+import sklearn
+from sklearn import svm
+
+'''
+Gesture classification without Qt, used by the PredictNode and the
+headless Pipeline.
+
+Training data maps gesture names to the x, y and z frequencies of
+one recorded gesture, like the rows of training_data.csv:
+
+    {"nothing": {"x": [...], "y": [...], "z": [...]}, "hit": {...}}
+
+The gesture index predicted by the classifier is the position of the
+gesture in the training data, so the first gesture should be the one
+that does not trigger a sound.
+
+Features are float32 matrices built by build_feature_matrix: the first
+DATA_LENGTH values of x, y and z (zero padded if shorter). Models
+trained before used these values three times (LEGACY_LAYOUT); the layout
+is taken from the number of features of a model, so they still work.
+
+Fitted SVMs are kept in a ModelCache: keyed by a hash of the training
+examples and the preprocessing and SVM parameters, they are pickled to
+MODEL_CACHE_DIRECTORY in the data directory and shared by all
+classifiers with the same training data. Changed training data have
+another hash, so the cache never returns an outdated model.
+
+The data directory (model cache and gesture stores of the demos) is
+$DRUMKIT_DATA or drumkit/ in the user's data directory
+($XDG_DATA_HOME or ~/.local/share), not the working directory.
+'''
+
+# number of frequencies per axis used as features
+DATA_LENGTH = 30
+# environment variable overriding the data directory
+DATA_DIRECTORY_VARIABLE = 'DRUMKIT_DATA'
+# directory of the model cache in the data directory
+MODEL_CACHE_DIRECTORY = 'model_cache'
+# number of pickled models kept, the least recently used are deleted
+MODEL_CACHE_SIZE = 8
+# changes whenever the features or the pickled model change
+MODEL_CACHE_VERSION = 2
+FEATURE_DTYPE = np.float32
+# feature layouts: DATA_LENGTH x, y and z values ...
+COMPACT_LAYOUT = 'compact'
+# ... or these repeated three times, the layout of the old models
+LEGACY_LAYOUT = 'legacy'
+# layout new models are trained with
+FEATURE_LAYOUT = COMPACT_LAYOUT
+LAYOUT_REPEATS = {COMPACT_LAYOUT: 1, LEGACY_LAYOUT: 3}
+
+
+# values of one axis, a window (m,) or a batch of windows (n, m),
+# as (n, length): truncated or zero padded to length
+def _fit_length(values, length):
+    values = np.asarray(values, dtype=FEATURE_DTYPE)
+    if values.ndim == 1:
+        values = values.reshape(1, -1)
+    if values.shape[1] >= length:
+        return values[:, :length]
+    padded = np.zeros((len(values), length), dtype=FEATURE_DTYPE)
+    padded[:, :values.shape[1]] = values
+    return padded
+
+
+# feature matrix (n, 3 * length) (legacy: (n, 9 * length)), float32 and
+# contiguous, of one window per axis or of batches of windows (n, m)
+def build_feature_matrix(x, y, z, length=DATA_LENGTH, layout=FEATURE_LAYOUT):
+    axes = [_fit_length(values, length) for values in (x, y, z)]
+    repeats = LAYOUT_REPEATS[layout]
+    features = np.empty((len(axes[0]), repeats, 3, length), dtype=FEATURE_DTYPE)
+    for i, values in enumerate(axes):
+        features[:, :, i, :] = values[:, np.newaxis, :]
+    return features.reshape(len(axes[0]), -1)
+
+
+# feature matrix of example rows (n, 3 * m) holding m x, then y, then z
+# values each, like the rows of a GestureStore
+def build_example_matrix(rows, length=DATA_LENGTH, layout=FEATURE_LAYOUT):
+    rows = np.asarray(rows, dtype=FEATURE_DTYPE)
+    rows = rows.reshape(len(rows), 3, -1)
+    return build_feature_matrix(rows[:, 0], rows[:, 1], rows[:, 2],
+                                length, layout)
+
+
+# layout of a fitted model by its number of features
+def get_layout(model, length=DATA_LENGTH):
+    for layout, repeats in LAYOUT_REPEATS.items():
+        if getattr(model, 'n_features_in_', None) == 3 * repeats * length:
+            return layout
+    raise ValueError(f'model with {getattr(model, "n_features_in_", None)} '
+                     f'features does not match DATA_LENGTH {length}')
+
+
+# feature row of one gesture in the layout of the old models
+def build_features(x, y, z, length=DATA_LENGTH):
+    return build_feature_matrix(x, y, z, length, LEGACY_LAYOUT)[0]
+
+
+# reads a training data csv (gestureName, frequenciesX, -Y, -Z with
+# "|" separated values) or a GestureStore directory into the training
+# data dict
+def load_training_data(path):
+    if os.path.isdir(path):
+        from GestureStore import GestureStore
+
+        return GestureStore(path).to_training_data()
+    data = {}
+    with open(path, newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            if len(row) < 4:
+                continue
+            data[row[0]] = {axis: np.array(values.split('|'), dtype=float)
+                            for axis, values in zip('xyz', row[1:4])}
+    return data
+
+
+# training examples of a training data dict: (gesture names, label of
+# every row, rows of DATA_LENGTH x, then y, then z values)
+def get_examples(data, length=DATA_LENGTH):
+    rows = [np.concatenate([np.asarray(value.get(axis), dtype=float)[:length]
+                            for axis in 'xyz'])
+            for value in data.values()]
+    return list(data.keys()), np.arange(len(data)), rows
+
+
+# directory of the user's drumkit data, see above
+def get_data_directory():
+    directory = os.environ.get(DATA_DIRECTORY_VARIABLE)
+    if directory:
+        return directory
+    base = os.environ.get('XDG_DATA_HOME') or os.path.join(
+        os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(base, 'drumkit')
+
+
+# fitted SVMs by a content hash of their training data,
+# pickled to directory (default: the model cache in the data directory)
+class ModelCache():
+    def __init__(self, directory=None, size=MODEL_CACHE_SIZE):
+        if directory is None:
+            directory = os.path.join(get_data_directory(),
+                                     MODEL_CACHE_DIRECTORY)
+        self.directory = directory
+        self.size = size
+        self._models = {}
+
+    # sha256 of the examples and of everything the model depends on
+    def get_key(self, labels, rows, layout=FEATURE_LAYOUT):
+        labels = np.ascontiguousarray(labels, dtype=np.int64)
+        rows = np.ascontiguousarray(rows)
+        parameters = {'version': MODEL_CACHE_VERSION,
+                      'sklearn': sklearn.__version__,
+                      'data_length': DATA_LENGTH,
+                      'layout': layout,
+                      'svm': svm.SVC().get_params(),
+                      'rows': [rows.shape, rows.dtype.str]}
+        digest = hashlib.sha256(json.dumps(parameters, sort_keys=True,
+                                           default=str).encode())
+        digest.update(labels.tobytes())
+        digest.update(rows.tobytes())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pickle')
+
+    # the fitted SVM for the examples: shared from memory,
+    # loaded from disk or fitted (and saved) now
+    def get_model(self, labels, rows, layout=FEATURE_LAYOUT):
+        key = self.get_key(labels, rows, layout)
+        model = self._models.get(key)
+        if model is None:
+            model = self._load(key)
+        if model is None:
+            model = svm.SVC()
+            model.fit(build_example_matrix(rows, layout=layout),
+                      [int(label) for label in labels])
+            self._save(key, model)
+        self._models.pop(key, None)
+        self._models[key] = model
+        if len(self._models) > self.size:
+            del self._models[next(iter(self._models))]
+        return model
+
+    def _load(self, key):
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'rb') as file:
+                model = pickle.load(file)
+        except Exception as e:
+            print(f'model cache: {e}')
+            return None
+        # marks the model as recently used
+        os.utime(path)
+        return model
+
+    def _save(self, key, model):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = self._path(key) + '.tmp'
+            with open(temp_path, 'wb') as file:
+                pickle.dump(model, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+            self._evict()
+        except OSError as e:
+            print(f'model cache: {e}')
+
+    # deletes the least recently used models above size
+    def _evict(self):
+        paths = [os.path.join(self.directory, name)
+                 for name in os.listdir(self.directory)
+                 if name.endswith('.pickle')]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for path in paths[self.size:]:
+            os.remove(path)
+
+    # forgets all models, in memory and on disk
+    def clear(self):
+        self._models = {}
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.pickle'):
+                    os.remove(os.path.join(self.directory, name))
+
+
+_model_cache = None
+
+
+# returns the model cache shared by all classifiers
+def get_model_cache():
+    global _model_cache
+    if _model_cache is None:
+        _model_cache = ModelCache()
+    return _model_cache
+
+
+# layout: the feature layout new models are trained with; predict()
+# uses the layout of the model, so models of both layouts work
+class GestureClassifier():
+    def __init__(self, layout=FEATURE_LAYOUT):
+        self.layout = layout
+        self.classifier = None
+        self.gesture_names = []
+        # values per axis of the training examples (at most DATA_LENGTH,
+        # shorter ones are zero padded); predict() waits for as many
+        self.input_length = DATA_LENGTH
+
+    # trains a SVM with one gesture per class, needs at least two gestures
+    def fit(self, data, cache=None):
+        self.fit_examples(*get_examples(data), cache=cache)
+
+    # trains with any number of examples per gesture: rows of
+    # DATA_LENGTH x, then y, then z values (like the rows of a
+    # GestureStore) and the index of their gesture name in gesture_names.
+    # With a ModelCache the SVM is taken from (and added to) the cache.
+    def fit_examples(self, gesture_names, labels, rows, cache=None):
+        self.gesture_names = list(gesture_names)
+        self.classifier = None
+        if len(rows):
+            self.input_length = min(DATA_LENGTH, np.size(rows[0]) // 3)
+        if len(set(int(label) for label in labels)) < 2:
+            return
+        if cache is not None:
+            self.classifier = cache.get_model(labels, rows, self.layout)
+            return
+        self.classifier = svm.SVC()
+        self.classifier.fit(build_example_matrix(rows, layout=self.layout),
+                            [int(label) for label in labels])
+
+    # uses a fitted SVM, e.g. one pickled before, in either layout
+    def set_model(self, model, gesture_names):
+        get_layout(model)
+        self.classifier = model
+        self.gesture_names = list(gesture_names)
+
+    def is_fitted(self):
+        return self.classifier is not None
+
+    # feature layout of the fitted model
+    def get_layout(self):
+        if self.classifier is None:
+            return self.layout
+        return get_layout(self.classifier)
+
+    # index of the predicted gesture, None without training data or while
+    # there are less values per axis than the training examples had
+    # (e.g. while the ConvolveNode's window fills); inputs shorter than
+    # DATA_LENGTH, like the GoertzelNode's bins, are zero padded
+    def predict(self, x, y, z):
+        if self.classifier is None:
+            return None
+        if min(len(x), len(y), len(z)) < self.input_length:
+            return None
+        features = build_feature_matrix(x, y, z, layout=self.get_layout())
+        return int(self.classifier.predict(features)[0])
+
+    def get_gesture_name(self, index):
+        return self.gesture_names[index]
@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+import csv
+import json
+import os
+import re
+import sys
+from time import monotonic
+import numpy as np
+
+'''
+Binary store of recorded gestures, replacing the "|" separated csv.
+
+A store is a directory with these files:
+
+    samples.f32     float32 matrix, one row per gesture:
+                    DATA_LENGTH x, then y, then z frequencies
+    labels.i32      int32 index of the gesture name of every row
+    tombstones.i32  int32 indices of deleted rows
+    meta.json       gesture names, DATA_LENGTH, the rate (Hz) of the
+                    device and the convolution kernel size
+
+All data files are append-only: adding a gesture appends one row and
+one label, deleting one appends a tombstone, so both cost the same
+for any number of gestures. Writes are fsynced in batches (every
+SYNC_ROWS rows or SYNC_INTERVAL seconds, and on flush() and close()).
+The number of rows is the number of complete rows in both files, so a
+crash while appending loses at most the unsynced rows and never leaves
+a half written one. meta.json is only rewritten (atomically, before
+the rows using it) when a new gesture name is added.
+
+compact() drops the deleted rows. It writes new files first and marks
+the store as compacting in meta.json before replacing the old files;
+opening a store marked as compacting finishes the compaction.
+
+Samples and labels are read as memory maps.
+
+    store = GestureStore('training_data')
+    store.append('hit', x, y, z)
+    classifier.fit(store.to_training_data())
+    store.close()
+
+The csv files of trainingData/ are imported with
+
+    python GestureStore.py import ../trainingData stores
+'''
+
+DATA_LENGTH = 30
+KERNEL_SIZE = 10
+STORE_VERSION = 1
+SAMPLES_FILE = 'samples.f32'
+LABELS_FILE = 'labels.i32'
+TOMBSTONES_FILE = 'tombstones.i32'
+META_FILE = 'meta.json'
+# suffix of the files written by compact()
+COMPACT_SUFFIX = '.compact'
+SAMPLE_DTYPE = np.float32
+LABEL_DTYPE = np.int32
+# rows appended between two fsyncs
+SYNC_ROWS = 16
+# seconds after which appended rows are fsynced anyway
+SYNC_INTERVAL = 1.0
+# a WindowCapture keeps every CAPTURE_STRIDE-th window ...
+CAPTURE_STRIDE = 5
+# ... up to CAPTURE_CAPACITY windows (30 s at 60 Hz are 1800 windows)
+CAPTURE_CAPACITY = 4096
+
+
+# writes the directory entries (renamed files) to disk
+def _sync_directory(path):
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class GestureStore():
+    # opens the store in directory path or creates a new one
+    # (data_length, rate and kernel_size are only used for new stores)
+    def __init__(self, path, data_length=DATA_LENGTH, rate=None,
+                 kernel_size=KERNEL_SIZE, sync_rows=SYNC_ROWS,
+                 sync_interval=SYNC_INTERVAL):
+        self.path = path
+        self.sync_rows = sync_rows
+        self.sync_interval = sync_interval
+        if os.path.isfile(self._file(META_FILE)):
+            with open(self._file(META_FILE)) as file:
+                self.meta = json.load(file)
+            if self.meta.get('version') != STORE_VERSION:
+                raise ValueError(f'{path}: unsupported store version '
+                                 f'{self.meta.get("version")}')
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.meta = {'version': STORE_VERSION,
+                         'data_length': int(data_length), 'rate': rate,
+                         'kernel_size': kernel_size, 'gestures': []}
+            self._write_meta()
+        self.data_length = self.meta['data_length']
+        self._row_bytes = 3 * self.data_length * np.dtype(SAMPLE_DTYPE).itemsize
+        self._recover()
+        self._open_files()
+        self._samples = None
+        self._labels = None
+
+    # number of rows, deleted ones included
+    def __len__(self):
+        return self._rows
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    # meta.json is replaced at once, so a crash never leaves half of it
+    def _write_meta(self):
+        temp_path = self._file(META_FILE + '.tmp')
+        with open(temp_path, 'w') as file:
+            json.dump(self.meta, file, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self._file(META_FILE))
+
+    # finishes an interrupted compaction and cuts incomplete rows
+    def _recover(self):
+        compacting = self.meta.pop('compacting', False)
+        for name in (SAMPLES_FILE, LABELS_FILE):
+            new_path = self._file(name + COMPACT_SUFFIX)
+            if compacting and os.path.isfile(new_path):
+                os.replace(new_path, self._file(name))
+            elif os.path.isfile(new_path):
+                # the compaction did not finish writing, the old files are valid
+                os.remove(new_path)
+        if compacting:
+            # the tombstones belong to the rows before the compaction
+            open(self._file(TOMBSTONES_FILE), 'wb').close()
+            _sync_directory(self.path)
+            self._write_meta()
+
+        sizes = []
+        for name in (SAMPLES_FILE, LABELS_FILE, TOMBSTONES_FILE):
+            path = self._file(name)
+            sizes.append(os.path.getsize(path) if os.path.isfile(path) else 0)
+        label_size = np.dtype(LABEL_DTYPE).itemsize
+        self._rows = min(sizes[0] // self._row_bytes, sizes[1] // label_size)
+        self._tombstone_count = sizes[2] // label_size
+        for name, size in ((SAMPLES_FILE, self._rows * self._row_bytes),
+                           (LABELS_FILE, self._rows * label_size),
+                           (TOMBSTONES_FILE, self._tombstone_count * label_size)):
+            with open(self._file(name), 'ab') as file:
+                file.truncate(size)
+
+        # a crash can lose rows whose tombstones were written; they would
+        # delete the rows appended at the same index later
+        tombstones = np.fromfile(self._file(TOMBSTONES_FILE),
+                                 dtype=LABEL_DTYPE)
+        if np.any(tombstones >= self._rows):
+            tombstones = tombstones[tombstones < self._rows]
+            with open(self._file(TOMBSTONES_FILE), 'wb') as file:
+                file.write(tombstones.tobytes())
+                file.flush()
+                os.fsync(file.fileno())
+            self._tombstone_count = len(tombstones)
+
+    def _open_files(self):
+        self._files = [open(self._file(name), 'ab')
+                       for name in (SAMPLES_FILE, LABELS_FILE, TOMBSTONES_FILE)]
+        self._unsynced = 0
+        self._last_sync = monotonic()
+        self._deleted = None
+
+    # index of a gesture name, new names are added
+    def _get_label(self, name):
+        gestures = self.meta['gestures']
+        if name not in gestures:
+            gestures.append(name)
+            # written before any row uses the new label
+            self._write_meta()
+        return gestures.index(name)
+
+    # one sample row: DATA_LENGTH values per axis, longer axes are cut
+    def _build_row(self, x, y, z):
+        row = np.empty(3 * self.data_length, dtype=SAMPLE_DTYPE)
+        for i, values in enumerate((x, y, z)):
+            values = np.asarray(values, dtype=SAMPLE_DTYPE)
+            if len(values) < self.data_length:
+                raise ValueError(f'{len(values)} values per axis, '
+                                 f'the store needs {self.data_length}')
+            row[i * self.data_length:(i + 1) * self.data_length] = \
+                values[:self.data_length]
+        return row
+
+    # appends one recorded gesture, returns its row index
+    def append(self, name, x, y, z):
+        return self.extend([name], [self._build_row(x, y, z)])
+
+    # appends rows (shape (n, 3 * DATA_LENGTH)) with one name each,
+    # returns the index of the first new row
+    def extend(self, names, rows):
+        rows = np.ascontiguousarray(rows, dtype=SAMPLE_DTYPE).reshape(
+            -1, 3 * self.data_length)
+        if len(rows) != len(names):
+            raise ValueError(f'{len(names)} names for {len(rows)} rows')
+        labels = np.array([self._get_label(name) for name in names],
+                          dtype=LABEL_DTYPE)
+        first_row = self._rows
+        self._files[0].write(rows.tobytes())
+        self._files[1].write(labels.tobytes())
+        self._rows += len(rows)
+        self._samples = None
+        self._labels = None
+        self._changed(len(rows))
+        return first_row
+
+    # marks a row as deleted, its index stays valid until compact()
+    def delete(self, index):
+        if not 0 <= index < self._rows:
+            raise IndexError(f'row {index} of {self._rows}')
+        if self.is_deleted(index):
+            return
+        self._files[2].write(np.array([index], dtype=LABEL_DTYPE).tobytes())
+        self._tombstone_count += 1
+        self._deleted.add(index)
+        self._changed(1)
+
+    # marks all rows of a gesture name as deleted, returns their number
+    def delete_gesture(self, name):
+        if name not in self.meta['gestures']:
+            return 0
+        label = self.meta['gestures'].index(name)
+        labels = np.asarray(self.get_labels())
+        rows = [index for index in self.get_live_indices()
+                if labels[index] == label]
+        if rows:
+            self._files[2].write(np.array(rows, dtype=LABEL_DTYPE).tobytes())
+            self._tombstone_count += len(rows)
+            self._deleted.update(rows)
+            self._changed(len(rows))
+        return len(rows)
+
+    # number of rows that are not deleted per gesture name, in the order
+    # the names were added; names without rows are left out
+    def get_gesture_counts(self):
+        live = self.get_live_indices()
+        counts = np.bincount(np.asarray(self.get_labels())[live],
+                             minlength=len(self.meta['gestures']))
+        return {name: int(count)
+                for name, count in zip(self.meta['gestures'], counts) if count}
+
+    def _changed(self, count):
+        self._unsynced += count
+        if self._unsynced >= self.sync_rows or \
+                monotonic() - self._last_sync >= self.sync_interval:
+            self.flush()
+
+    # writes all appended rows and tombstones to disk
+    def flush(self):
+        for file in self._files:
+            file.flush()
+        if self._unsynced:
+            for file in self._files:
+                os.fsync(file.fileno())
+        self._unsynced = 0
+        self._last_sync = monotonic()
+
+    def get_deleted(self):
+        if self._deleted is None:
+            self._files[2].flush()
+            tombstones = np.fromfile(self._file(TOMBSTONES_FILE),
+                                     dtype=LABEL_DTYPE,
+                                     count=self._tombstone_count)
+            self._deleted = set(tombstones.tolist())
+        return self._deleted
+
+    def is_deleted(self, index):
+        return index in self.get_deleted()
+
+    # indices of all rows that are not deleted, in order
+    def get_live_indices(self):
+        deleted = self.get_deleted()
+        return [index for index in range(self._rows) if index not in deleted]
+
+    # all rows (deleted ones too) as read-only memory map,
+    # shape (rows, 3 * DATA_LENGTH)
+    def get_samples(self):
+        if self._samples is None:
+            shape = (self._rows, 3 * self.data_length)
+            if shape[0] == 0:
+                self._samples = np.zeros(shape, dtype=SAMPLE_DTYPE)
+            else:
+                self._files[0].flush()
+                self._samples = np.memmap(self._file(SAMPLES_FILE),
+                                          dtype=SAMPLE_DTYPE, mode='r',
+                                          shape=shape)
+        return self._samples
+
+    # label of every row as read-only memory map
+    def get_labels(self):
+        if self._labels is None:
+            if self._rows == 0:
+                self._labels = np.zeros(0, dtype=LABEL_DTYPE)
+            else:
+                self._files[1].flush()
+                self._labels = np.memmap(self._file(LABELS_FILE),
+                                         dtype=LABEL_DTYPE, mode='r',
+                                         shape=(self._rows,))
+        return self._labels
+
+    def get_gesture_names(self):
+        return list(self.meta['gestures'])
+
+    # gesture name of one row
+    def get_name(self, index):
+        return self.meta['gestures'][self.get_labels()[index]]
+
+    # name and x, y, z values of one row
+    def get_row(self, index):
+        row = self.get_samples()[index]
+        n = self.data_length
+        return self.get_name(index), row[:n], row[n:2 * n], row[2 * n:]
+
+    # all rows that are not deleted as training examples:
+    # (gesture names, label of every row, rows); labels index the names,
+    # gestures without rows are left out
+    def get_examples(self):
+        live = np.array(self.get_live_indices(), dtype=np.int64)
+        if len(live) == 0:
+            return [], np.zeros(0, dtype=LABEL_DTYPE), \
+                np.zeros((0, 3 * self.data_length), dtype=SAMPLE_DTYPE)
+        rows = np.asarray(self.get_samples())[live]
+        labels = np.asarray(self.get_labels())[live]
+        used = np.unique(labels)
+        gestures = self.meta['gestures']
+        remap = np.zeros(len(gestures), dtype=LABEL_DTYPE)
+        remap[used] = np.arange(len(used))
+        return [gestures[label] for label in used], remap[labels], rows
+
+    # training data dict of the GestureClassifier; like the csv, a
+    # gesture recorded several times is trained with its last recording
+    def to_training_data(self):
+        data = {}
+        for index in self.get_live_indices():
+            name, x, y, z = self.get_row(index)
+            data[name] = {"x": x, "y": y, "z": z}
+        return data
+
+    # rewrites the store without the deleted rows,
+    # the indices of the remaining rows change
+    def compact(self):
+        self.flush()
+        if self._tombstone_count == 0:
+            return
+        live = np.array(self.get_live_indices(), dtype=np.int64)
+        samples = np.asarray(self.get_samples())[live] if len(live) else \
+            np.zeros((0, 3 * self.data_length), dtype=SAMPLE_DTYPE)
+        labels = np.asarray(self.get_labels())[live] if len(live) else \
+            np.zeros(0, dtype=LABEL_DTYPE)
+        self.close()
+        for name, data in ((SAMPLES_FILE, samples), (LABELS_FILE, labels)):
+            with open(self._file(name + COMPACT_SUFFIX), 'wb') as file:
+                file.write(data.tobytes())
+                file.flush()
+                os.fsync(file.fileno())
+        # from here on opening the store finishes the compaction
+        self.meta['compacting'] = True
+        self._write_meta()
+        self._recover()
+        self._open_files()
+
+    # fsyncs and closes the files; the store can not be used afterwards
+    # except for compact()
+    def close(self):
+        if self._files:
+            self.flush()
+            for file in self._files:
+                file.close()
+            self._files = []
+        self._samples = None
+        self._labels = None
+
+
+# Collects the sliding windows of a training period as examples.
+# Every window passed to add() is checked: windows equal to the one
+# before (no new samples) are skipped, of the others every stride-th is
+# copied into a buffer allocated once. A full buffer drops windows.
+class WindowCapture():
+    def __init__(self, data_length=DATA_LENGTH, stride=CAPTURE_STRIDE,
+                 capacity=CAPTURE_CAPACITY):
+        self.data_length = data_length
+        self.stride = max(1, int(stride))
+        self._rows = np.empty((capacity, 3 * data_length), dtype=SAMPLE_DTYPE)
+        self._window = np.empty(3 * data_length, dtype=SAMPLE_DTYPE)
+        self._previous = np.empty(3 * data_length, dtype=SAMPLE_DTYPE)
+        self.clear()
+
+    def clear(self):
+        # windows kept, passed, skipped as duplicate and dropped when full
+        self.count = 0
+        self.seen = 0
+        self.duplicates = 0
+        self.dropped = 0
+
+    # adds the window of x, y, z values (the first DATA_LENGTH of each),
+    # returns if it was kept; shorter windows are ignored
+    def add(self, x, y, z):
+        n = self.data_length
+        if min(len(x), len(y), len(z)) < n:
+            return False
+        window = self._window
+        window[:n] = x[:n]
+        window[n:2 * n] = y[:n]
+        window[2 * n:] = z[:n]
+        if self.seen > 0 and np.array_equal(window, self._previous):
+            self.duplicates += 1
+            return False
+        self._previous[:] = window
+        self.seen += 1
+        if (self.seen - 1) % self.stride:
+            return False
+        if self.count == len(self._rows):
+            self.dropped += 1
+            return False
+        self._rows[self.count] = window
+        self.count += 1
+        return True
+
+    # adds a window of shape (n, 3)
+    def add_window(self, window):
+        return self.add(window[:, 0], window[:, 1], window[:, 2])
+
+    # kept windows, shape (count, 3 * DATA_LENGTH), valid until clear()
+    def get_rows(self):
+        return self._rows[:self.count]
+
+    # appends all kept windows to a GestureStore as gesture name
+    def save(self, store, name):
+        if self.count:
+            store.extend([name] * self.count, self.get_rows())
+        return self.count
+
+
+# imports a training data csv (gestureName, frequenciesX, -Y, -Z with
+# "|" separated values) into a new store; DATA_LENGTH is the number of
+# values per axis of the csv, the rate is taken from file names like
+# "training_data copy_60hz_15dl_10sec.csv" if not given
+def import_csv(csv_path, store_path, rate=None, kernel_size=KERNEL_SIZE):
+    names = []
+    rows = []
+    with open(csv_path, newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            if len(row) < 4:
+                continue
+            names.append(row[0])
+            rows.append([np.array(values.split('|'), dtype=SAMPLE_DTYPE)
+                         for values in row[1:4]])
+    if rate is None:
+        match = re.search(r'(\d+)hz', os.path.basename(csv_path))
+        rate = int(match.group(1)) if match else None
+    data_length = min(min(len(values) for values in row) for row in rows) \
+        if rows else DATA_LENGTH
+    store = GestureStore(store_path, data_length, rate, kernel_size)
+    if len(store) > 0:
+        raise ValueError(f'{store_path} is not empty')
+    if rows:
+        store.extend(names, [np.concatenate([values[:data_length]
+                                             for values in row])
+                             for row in rows])
+        store.flush()
+    return store
+
+
+# imports every csv of a directory into a store of the same name
+def import_directory(csv_directory, store_directory):
+    stores = []
+    for name in sorted(os.listdir(csv_directory)):
+        if name.endswith('.csv'):
+            store_path = os.path.join(store_directory, name[:-len('.csv')])
+            stores.append(import_csv(os.path.join(csv_directory, name),
+                                     store_path))
+    return stores
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == 'import':
+        if os.path.isdir(sys.argv[2]):
+            stores = import_directory(sys.argv[2], sys.argv[3])
+        else:
+            stores = [import_csv(sys.argv[2], sys.argv[3])]
+        for store in stores:
+            print(f'{store.path}: {len(store)} gestures, '
+                  f'{store.get_gesture_names()}')
+    else:
+        print('usage: python GestureStore.py import CSV_FILE|CSV_DIRECTORY STORE')
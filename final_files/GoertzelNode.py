@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+from pyqtgraph.flowchart import Flowchart, Node
+from ChunkedInput import ChunkedInput
+from Spectrum import Goertzel
+
+# the frequency bins we look at, bin k is k * Hz / BLOCK_LENGTH
+BINS = (1, 2, 3, 4, 5, 6, 7, 8)
+# samples per Goertzel block, same as the FftNode window
+BLOCK_LENGTH = 120
+# new magnitudes every HOP_SIZE samples
+HOP_SIZE = 10
+
+
+# spectral node that only computes a few selected frequency bins
+class GoertzelNode(Node):
+    """
+    Outputs the magnitudes of a few selected frequency bins per axis
+    as float32 arrays, normalized like the FftNode output.
+    Each sample costs O(len(bins)) instead of a whole FFT.
+    """
+    nodeName = "GoertzelNode"
+
+    def __init__(self, name):
+        Node.__init__(self, name, terminals={
+            "accelX": dict(io="in"),
+            "accelY": dict(io="in"),
+            "accelZ": dict(io="in"),
+            # sample count of the Buffer node the inputs are windows of
+            "total": dict(io="in"),
+            "setActive": dict(io="in"),
+            "frequencyX": dict(io="out"),
+            "frequencyY": dict(io="out"),
+            "frequencyZ": dict(io="out"),
+        })
+        self._init_state()
+
+    def _init_state(self):
+        self.had_input_yet = False
+        # chunks, or windows with the sample count of a Buffer node
+        self._input = ChunkedInput()
+        self.set_bins()
+
+    def set_bins(self, bins=BINS, block_length=BLOCK_LENGTH, hop_size=HOP_SIZE):
+        self._goertzel = Goertzel(bins, block_length, 3, hop_size)
+
+    def get_had_input_yet(self):
+        return self.had_input_yet
+
+    def process(self, **kwds):
+        self.had_input_yet = True
+        self._goertzel.extend(self._input.new_axis_samples(
+            kwds["accelX"], kwds["accelY"], kwds["accelZ"], kwds["total"]))
+        magnitudes = self._goertzel.magnitudes()
+
+        # copies, the engine reuses its output array
+        return {'frequencyX': magnitudes[:, 0].copy(),
+                'frequencyY': magnitudes[:, 1].copy(),
+                'frequencyZ': magnitudes[:, 2].copy()}
+
+
+# GoertzelNode with one terminal for all axes: "accel" takes (n, 3) samples,
+# "frequency" outputs the (len(bins), 3) float32 magnitudes
+class GoertzelNode3(GoertzelNode):
+    nodeName = "GoertzelNode3"
+
+    def __init__(self, name):
+        Node.__init__(self, name, terminals={
+            "accel": dict(io="in"),
+            "total": dict(io="in"),
+            "setActive": dict(io="in"),
+            "frequency": dict(io="out"),
+        })
+        self._init_state()
+
+    def process(self, **kwds):
+        self.had_input_yet = True
+        self._goertzel.extend(
+            self._input.new_samples(kwds["accel"], kwds["total"]))
+        return {'frequency': self._goertzel.magnitudes().copy()}
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+import numpy as np
+from scipy import signal
+
+'''
+Streaming Butterworth filter for multi-channel sensor samples.
+
+The filter coefficients are computed once per configuration and the
+filter state of every channel is kept between calls, so each new sample
+only costs a few multiply-adds. Chunks of samples of shape (n, channels)
+are filtered in one call.
+
+btype "lowpass" smooths the signal, "highpass" removes the constant
+gravity component and "bandpass" (cutoff = (low, high)) does both.
+'''
+
+
+class IirFilter:
+
+    def __init__(self, btype="highpass", cutoff=0.5, rate=30, order=2):
+        self.btype = btype
+        self.cutoff = cutoff
+        self.rate = rate
+        self.order = order
+        # second-order sections are numerically more stable than (b, a)
+        self._sos = signal.butter(order, cutoff, btype=btype, fs=rate,
+                                  output="sos")
+        # state for a constant input of 1, scaled by the first sample
+        # so the filter does not start with a jump from zero
+        self._zi_step = signal.sosfilt_zi(self._sos)[:, :, np.newaxis]
+        self._zi = None
+
+    def reset(self):
+        self._zi = None
+
+    # filters samples of shape (n, channels) and returns
+    # the filtered samples in the same shape
+    def filter(self, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        if len(samples) == 0:
+            return samples
+        if self._zi is None:
+            self._zi = self._zi_step * samples[0]
+        filtered, self._zi = signal.sosfilt(self._sos, samples, axis=0,
+                                            zi=self._zi)
+        return filtered
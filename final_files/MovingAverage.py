@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+import numpy as np
+from RingBuffer import RingBuffer
+
+'''
+Streaming moving average over a sliding window.
+
+output() returns the same values as
+np.abs(np.convolve(window, np.ones(kernel_size) / kernel_size, mode="same"))
+for every channel of the window, but instead of convolving the whole
+window for every new sample, a running sum of the last kernel_size samples
+is updated per sample. Only the few output values at the window edges,
+where the kernel is cut off, are summed up again.
+
+Samples are rows of shape (channels,), e.g. x/y/z of the accelerometer,
+so all channels are updated in one numpy call.
+'''
+
+# the running sum is recomputed from the window every RESYNC samples
+# so floating point errors can not pile up
+RESYNC = 1024
+
+
+class MovingAverage:
+
+    def __init__(self, length, kernel_size, channels):
+        if kernel_size > length:
+            raise ValueError("kernel_size can not be larger than the window")
+        self.length = length
+        self.kernel_size = kernel_size
+        self.channels = channels
+        self._kernel = np.ones(kernel_size) / kernel_size
+        # np.convolve(mode="same") centers the kernel with this offset
+        self._offset = (kernel_size - 1) // 2
+        self._window = RingBuffer(length, channels)
+        # sums over kernel_size samples that are completely inside the window
+        self._sums = RingBuffer(length - kernel_size + 1, channels)
+        self._sum = np.zeros(channels)
+        self._since_resync = 0
+        # preallocated result and scratch arrays
+        self._out = np.zeros((length, channels))
+        self._left = np.zeros((kernel_size - 1, channels))
+        self._right = np.zeros((kernel_size - 1, channels))
+
+    def __len__(self):
+        return len(self._window)
+
+    # the raw samples of the sliding window
+    def window(self):
+        return self._window.window()
+
+    # push a single sample of shape (channels,)
+    def append(self, sample):
+        k = self.kernel_size
+        if len(self._window) >= k:
+            # the sample that drops out of the running sum
+            np.subtract(self._sum, self._window.window(k)[0], out=self._sum)
+        np.add(self._sum, sample, out=self._sum)
+        self._window.append(sample)
+
+        self._since_resync += 1
+        if self._since_resync >= RESYNC:
+            self._since_resync = 0
+            np.sum(self._window.window(k), axis=0, out=self._sum)
+        if len(self._window) >= k:
+            self._sums.append(self._sum)
+
+    # push a chunk of samples of shape (n, channels)
+    def extend(self, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        if len(samples) == 1:
+            self.append(samples[0])
+            return
+        if len(samples) == 0:
+            return
+        k = self.kernel_size
+        self._window.extend(samples)
+        new_sums = min(len(samples), len(self._window) - k + 1)
+        if new_sums > 0:
+            # kernel sums for the new samples from a cumulative sum
+            cumulative = np.cumsum(
+                self._window.window(new_sums + k - 1), axis=0)
+            sums = cumulative[k - 1:]
+            sums[1:] -= cumulative[:new_sums - 1]
+            self._sums.extend(sums)
+            self._sum[:] = sums[-1]
+        else:
+            np.sum(self._window.window(k), axis=0, out=self._sum)
+        self._since_resync = 0
+
+    # moving average of the window, shape (len(self), channels).
+    # The result is a view into a preallocated array which is
+    # overwritten by the next call.
+    def output(self):
+        k = self.kernel_size
+        n = len(self._window)
+        data = self._window.window()
+        if n == 0:
+            return self._out[:0]
+        if n < k:
+            # the kernel is larger than the data, so let numpy handle it
+            for channel in range(self.channels):
+                self._out[:n, channel] = np.convolve(
+                    data[:, channel], self._kernel, mode="same")[:n]
+            out = self._out[:n]
+        else:
+            # number of values at the left and right edge
+            # where the kernel does not fit into the window
+            left = k - 1 - self._offset
+            right = self._offset
+            out = self._out[:n]
+            np.cumsum(data[:k - 1], axis=0, out=self._left)
+            out[:left] = self._left[right:]
+            np.cumsum(data[::-1][:k - 1], axis=0, out=self._right)
+            out[n - right:] = self._right[left:][::-1]
+            out[left:n - right] = self._sums.window(n - k + 1)
+            np.multiply(out, 1 / k, out=out)
+        np.abs(out, out=out)
+        return out
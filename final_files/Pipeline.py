@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+import argparse
+import json
+import os
+import sys
+from time import sleep, monotonic
+from DIPPID import create_sensor, get_udp_multiplexer
+from RingBuffer import RingBuffer
+from MovingAverage import MovingAverage
+from Spectrum import Stft, SlidingDft, Goertzel
+from IirFilter import IirFilter
+from GestureClassifier import GestureClassifier, load_training_data
+from GestureClassifier import get_model_cache
+from GestureStore import GestureStore
+from DrumSynth import DrumSynth
+from Timing import Timings, LatencyTracer
+
+'''
+Headless runtime for the drumkit, no Qt needed.
+
+Runs the same stages as the flowchart of system_demo
+(sensor -> convolution -> classification -> sound) with the same
+engines the nodes use, in a plain process. The graph is declarative:
+an ordered mapping of stage names to their type, the stage they read
+from ("input") and their parameters, e.g. as JSON:
+
+    {
+        "device0": {"type": "sensor", "address": "5700"},
+        "convolve0": {"type": "convolve", "input": "device0"},
+        "predict0": {"type": "classify", "input": "convolve0",
+                     "training_data": "training_data.csv"},
+        "sound0": {"type": "sound", "input": "predict0", "sensor": "device0"}
+    }
+
+Inputs have to be declared before the stages reading them.
+Data between stages are (n, 3) arrays like the single terminal nodes use,
+a stage returning None stops the propagation of this step.
+Unlike the nodes, stages return views of their engines' buffers without
+copying; they are only valid until the stage processes again, so a
+stage that keeps its input has to copy it.
+
+    python Pipeline.py 5700 5701
+    python Pipeline.py --graph graph.json --duration 60 --mute --timing
+    python Pipeline.py 5700 --trace latency.csv
+'''
+
+# seconds between two steps of Pipeline.run()
+STEP_INTERVAL = 1 / 60
+# seconds between two predictions, the interval of the demo's prediction timer
+PREDICTION_INTERVAL = 0.4
+# drums of button_1, button_2, button_3 (bass drum, snare, hi-hat)
+DRUMS = (35, 38, 46)
+TRAINING_DATA_FILE = "training_data.csv"
+
+
+# outputs the accelerometer samples received since the last step.
+# multiplexed: UDP ports share one receive thread (False: one per port)
+class SensorStage():
+    def __init__(self, address, speed=1, multiplexed=True):
+        multiplexer = get_udp_multiplexer() if multiplexed else None
+        self.sensor = create_sensor(address, multiplexer, speed)
+        if self.sensor is None:
+            raise ValueError(f'invalid sensor address: {address}')
+        self._cursor = 0
+        self._batch_start = (-1, None)
+        # samples read and samples overwritten in the
+        # sensor's history before they were read
+        self.samples = 0
+        self.lost = 0
+
+    def read(self):
+        cursor = self._cursor
+        timestamps, values, self._cursor = self.sensor.get_samples_since(
+            'accelerometer', self._cursor)
+        self.lost += self._cursor - len(values) - cursor
+        if len(values) == 0 or values.shape[1] != 3:
+            return None
+        self.samples += len(values)
+        self._batch_start = (self._cursor - len(values), timestamps[0])
+        return values
+
+    # history index and (monotonic) receive time of the first sample
+    # of the last read, used by the LatencyTracer
+    def get_trace(self):
+        return self._batch_start
+
+    # number of the pressed button (1, 2, 3) or 0
+    def get_pressed_button(self):
+        for button in (1, 2, 3):
+            if self.sensor.get_value(f'button_{button}') == 1:
+                return button
+        return 0
+
+    def close(self):
+        self.sensor.disconnect()
+
+
+# window of the last size samples, like the Buffer node
+class BufferStage():
+    def __init__(self, size=32):
+        self._buffer = RingBuffer(size, 3)
+
+    def process(self, samples):
+        self._buffer.extend(samples)
+        return self._buffer.window()
+
+
+# moving average of the last length samples, like the ConvolveNode
+class ConvolveStage():
+    def __init__(self, length=30, kernel_size=10):
+        self._average = MovingAverage(length, kernel_size, 3)
+
+    def process(self, samples):
+        self._average.extend(samples)
+        return self._average.output()
+
+
+# magnitude spectrum of the last 2 * length samples, like the FftNode
+class FftStage():
+    def __init__(self, length=60, window="rect", hop_size=1, sliding=False):
+        if sliding:
+            self._spectrum = SlidingDft(2 * length, 3, window, hop_size)
+        else:
+            self._spectrum = Stft(2 * length, 3, window, hop_size)
+
+    def process(self, samples):
+        self._spectrum.extend(samples)
+        return self._spectrum.spectrum()
+
+
+# magnitudes of a few frequency bins, like the GoertzelNode
+class GoertzelStage():
+    def __init__(self, bins=(1, 2, 3, 4, 5, 6, 7, 8), block_length=120,
+                 hop_size=10):
+        self._goertzel = Goertzel(bins, block_length, 3, hop_size)
+
+    def process(self, samples):
+        self._goertzel.extend(samples)
+        return self._goertzel.magnitudes()
+
+
+# streaming butterworth filter, like the FilterNode
+class FilterStage():
+    def __init__(self, btype="highpass", cutoff=0.5, rate=30, order=2):
+        self._filter = IirFilter(btype, cutoff, rate, order)
+
+    def process(self, samples):
+        return self._filter.filter(samples)
+
+
+# classifies the latest frequencies every interval seconds like the
+# PredictNode with the demo's prediction timer; outputs the gesture index.
+# training_data is a csv file or a GestureStore directory
+class ClassifyStage():
+    def __init__(self, training_data=TRAINING_DATA_FILE,
+                 interval=PREDICTION_INTERVAL):
+        self.classifier = GestureClassifier()
+        if os.path.isdir(training_data):
+            # a GestureStore, trained with all its examples
+            self.classifier.fit_examples(
+                *GestureStore(training_data).get_examples(),
+                cache=get_model_cache())
+        else:
+            self.classifier.fit(load_training_data(training_data),
+                                get_model_cache())
+        self.interval = interval
+        self.predictions = 0
+        self._last_prediction = 0
+
+    def process(self, frequencies):
+        now = monotonic()
+        if now - self._last_prediction < self.interval:
+            return None
+        self._last_prediction = now
+        result = self.classifier.predict(
+            frequencies[:, 0], frequencies[:, 1], frequencies[:, 2])
+        if result is not None:
+            self.predictions += 1
+        return result
+
+
+# plays a drum for every predicted gesture except the first one.
+# sensor: the sensor stage whose buttons select one of drums
+# mute: only count the hits (no audio needed)
+class SoundStage():
+    def __init__(self, sensor=None, drums=DRUMS, mute=False):
+        self.sensor = sensor
+        self.drums = drums
+        self.mute = mute
+        self.hits = 0
+        self._synth = DrumSynth()
+        self._drum = drums[0]
+
+    def process(self, gesture):
+        if self.sensor is not None:
+            button = self.sensor.get_pressed_button()
+            if button:
+                self._drum = self.drums[button - 1]
+        if gesture > 0:
+            self.hits += 1
+            if not self.mute:
+                self._synth.play(self._drum)
+        return gesture
+
+
+STAGE_TYPES = {
+    "sensor": SensorStage,
+    "buffer": BufferStage,
+    "convolve": ConvolveStage,
+    "fft": FftStage,
+    "goertzel": GoertzelStage,
+    "filter": FilterStage,
+    "classify": ClassifyStage,
+    "sound": SoundStage,
+}
+
+
+# the drumkit of system_demo for any number of devices
+def drumkit_graph(addresses, training_data=TRAINING_DATA_FILE, mute=False):
+    graph = {}
+    for i, address in enumerate(addresses):
+        graph[f'device{i}'] = {"type": "sensor", "address": str(address)}
+        graph[f'convolve{i}'] = {"type": "convolve", "input": f'device{i}'}
+        graph[f'predict{i}'] = {"type": "classify", "input": f'convolve{i}',
+                                "training_data": training_data}
+        graph[f'sound{i}'] = {"type": "sound", "input": f'predict{i}',
+                              "sensor": f'device{i}', "mute": mute}
+    return graph
+
+
+class Pipeline():
+    def __init__(self, graph):
+        self.stages = {}
+        self._inputs = {}
+        self._types = {}
+        self._stopped = False
+        try:
+            for name, spec in graph.items():
+                self._add_stage(name, dict(spec))
+        except Exception:
+            self.close()
+            raise
+
+    def _add_stage(self, name, spec):
+        kind = spec.pop("type")
+        if kind not in STAGE_TYPES:
+            raise ValueError(f'{name}: unknown stage type {kind}')
+        source = spec.pop("input", None)
+        if kind == "sensor":
+            if source is not None:
+                raise ValueError(f'{name}: a sensor has no input')
+        elif source not in self.stages:
+            raise ValueError(f'{name}: input {source} has to be declared before')
+        # stages referenced by parameters, like the sensor of a sound stage
+        if isinstance(spec.get("sensor"), str):
+            spec["sensor"] = self.stages[spec["sensor"]]
+        self.stages[name] = STAGE_TYPES[kind](**spec)
+        self._inputs[name] = source
+        self._types[name] = kind
+
+    # name of the sensor stage the data of a stage come from
+    def _get_sensor(self, name):
+        while self._inputs[name] is not None:
+            name = self._inputs[name]
+        return name
+
+    # reads all sensors once and propagates their new samples,
+    # returns the outputs of all stages (None if a stage did not run)
+    def step(self):
+        outputs = {}
+        for name, stage in self.stages.items():
+            source = self._inputs[name]
+            if source is None:
+                outputs[name] = stage.read()
+                continue
+            data = outputs[source]
+            outputs[name] = None if data is None else stage.process(data)
+        return outputs
+
+    # records the time of every stage into timings (a Timings object)
+    def instrument(self, timings):
+        for name, stage in self.stages.items():
+            method = 'read' if self._inputs[name] is None else 'process'
+            timings.instrument(stage, method, f'{name}.{method}')
+        timings.instrument(self, 'step', 'pipeline.step')
+
+    # traces every hit from receiving the first sample after the previous
+    # prediction through all stages (named by their type) to the sound
+    def trace(self, tracer):
+        for name, stage in self.stages.items():
+            self._trace_stage(tracer, self._get_sensor(name),
+                              self._types[name], stage)
+
+    def _trace_stage(self, tracer, key, kind, stage):
+        def read(result):
+            if result is not None:
+                tracer.begin(key, *stage.get_trace())
+
+        def processed(result, data):
+            if result is not None:
+                tracer.mark(key, kind)
+
+        def classified(result, frequencies):
+            if result is not None:
+                tracer.snapshot(key)
+                tracer.mark_pending(key, kind)
+
+        def sound(result, gesture):
+            if gesture > 0:
+                tracer.mark_pending(key, kind)
+                tracer.finish(key)
+            else:
+                tracer.discard(key)
+
+        if kind == "sensor":
+            tracer.wrap(stage, 'read', after=read)
+        elif kind == "classify":
+            tracer.wrap(stage, 'process', after=classified)
+        elif kind == "sound":
+            tracer.wrap(stage, 'process', after=sound)
+        else:
+            tracer.wrap(stage, 'process', after=processed)
+
+    # steps every interval seconds for duration seconds (None: forever)
+    # or until stop() is called (e.g. from another thread)
+    def run(self, duration=None, interval=STEP_INTERVAL):
+        end = None if duration is None else monotonic() + duration
+        next_step = monotonic()
+        while not self._stopped and (end is None or next_step < end):
+            self.step()
+            next_step += interval
+            delay = next_step - monotonic()
+            if delay > 0:
+                sleep(delay)
+            else:
+                # too slow, do not try to catch up
+                next_step = monotonic()
+
+    # ends run() after the current step; a stopped pipeline does not
+    # run again, even if stop() was called before run()
+    def stop(self):
+        self._stopped = True
+
+    def close(self):
+        for stage in self.stages.values():
+            if hasattr(stage, "close"):
+                stage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='headless drumkit')
+    parser.add_argument('addresses', nargs='*',
+                        help='UDP ports, recordings, ... of the devices')
+    parser.add_argument('--graph', help='JSON file with the pipeline graph')
+    parser.add_argument('--training-data', default=TRAINING_DATA_FILE)
+    parser.add_argument('--duration', type=float, default=None)
+    parser.add_argument('--mute', action='store_true',
+                        help='count the hits instead of playing sounds')
+    parser.add_argument('--timing', action='store_true',
+                        help='print the time percentiles of every stage')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='write the latency breakdown of every hit as csv')
+    args = parser.parse_args()
+
+    if args.graph:
+        with open(args.graph) as file:
+            graph = json.load(file)
+    elif args.addresses:
+        graph = drumkit_graph(args.addresses, args.training_data, args.mute)
+    else:
+        parser.print_usage()
+        sys.exit(1)
+
+    pipeline = Pipeline(graph)
+    timings = None
+    if args.timing:
+        timings = Timings()
+        pipeline.instrument(timings)
+    tracer = None
+    if args.trace:
+        tracer = LatencyTracer()
+        pipeline.trace(tracer)
+    try:
+        pipeline.run(args.duration)
+    finally:
+        for name, stage in pipeline.stages.items():
+            if isinstance(stage, ClassifyStage):
+                print(f'{name}: {stage.predictions} predictions')
+            elif isinstance(stage, SoundStage):
+                print(f'{name}: {stage.hits} hits')
+        if timings is not None:
+            print(timings.format_summary())
+        if tracer is not None:
+            count = tracer.export_csv(args.trace)
+            print(f'{count} hits traced to {args.trace}')
+            for stage, median in tracer.get_medians().items():
+                print(f'{stage:20} {median:8.3f} ms (median)')
+        pipeline.close()
+
+
+if __name__ == '__main__':
+    main()
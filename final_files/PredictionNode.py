@@ -5,19 +5,17 @@
 
 import numpy
 from pyqtgraph.flowchart import Node
-from sklearn import svm
-import fluidsynth
 import time
+from GestureClassifier import GestureClassifier, build_feature_matrix
+from GestureClassifier import get_model_cache
+from DrumSynth import DrumSynth, raw_audio_string
 
-DATA_LENGTH = 30
 
+# flowchart adapter of the GestureClassifier
 class PredictNode(Node):
     nodeName = "PredictNode"
-    fs = fluidsynth.Synth(1)
-    fs.start(driver='alsa')
-    sfid = fs.sfload('./pns_drum.sf2')
-    # select MIDI track, sound font, MIDI bank and preset
-    fs.program_select(0, sfid, 0, 0)
+    # shared by all prediction nodes, started with the first sound
+    synth = DrumSynth()
     is_recording = False
 
     def __init__(self, name):
@@ -26,74 +24,54 @@ class PredictNode(Node):
             "accelerator_y": dict(io="in"),
             "accelerator_z": dict(io="in")
         })
+        self._init_state()
 
+    def _init_state(self):
         self.current_gesture_x_frequencies = []
         self.current_gesture_y_frequencies = []
         self.current_gesture_z_frequencies = []
         self.current_prediction = "None"
         self.training_data_dict = {}
+        self.classifier = GestureClassifier()
         self.recording = []
         self.time = time.time()
 
     def init_svm_with_data(self, data):
         print("initsvm with data")
-        # print(data)
         self.training_data_dict = data
-        self.classifier = svm.SVC()
-        categories = []
-        training_data = []
-        if len(data) > 1:
-            current_index = 0
-            for key, value in data.items():
-                categories += [current_index]
-                current_values_array = []
-                current_values_array.append(value.get("x"))
-                current_values_array.append(value.get("y"))
-                current_values_array.append(value.get("z"))
-
-                training_data += self.get_svm_data_array(current_values_array)
-
-                current_index += 1
-            self.classifier.fit(training_data, categories)
+        # nodes with the same data share one fitted (and cached) SVM
+        self.classifier.fit(data, get_model_cache())
 
+    # trains with several examples per gesture,
+    # e.g. GestureStore.get_examples()
+    def init_svm_with_examples(self, gesture_names, labels, rows):
+        self.classifier.fit_examples(gesture_names, labels, rows,
+                                     get_model_cache())
+
+    # feature matrix (1, n_features) in the layout of the classifier
     def get_svm_data_array(self, x_y_z_array):
-        svm_data_array = []
-        for value in x_y_z_array:
-            x_cut = []
-            for index, x_value in enumerate(x_y_z_array[0]):
-                if index < DATA_LENGTH:
-                    x_cut.append(x_value)
-            y_cut = []
-            for index, y_value in enumerate(x_y_z_array[1]):
-                if index < DATA_LENGTH:
-                    y_cut.append(y_value)
-            z_cut = []
-            for index, z_value in enumerate(x_y_z_array[2]):
-                if index < DATA_LENGTH:
-                    z_cut.append(z_value)
-
-            svm_data_array += x_cut + y_cut + z_cut
-        return [svm_data_array]
+        return build_feature_matrix(*x_y_z_array,
+                                    layout=self.classifier.get_layout())
 
     # testing sound accuracy
     def make_sound(self, result, drumNumber):
         if (result > 0):
-            self.fs.noteon(0, drumNumber, 100)
-            self.fs.noteoff(0, drumNumber)
+            self.synth.play(drumNumber)
             if self.is_recording:
                 dur = time.time() - self.time
-                self.recording = numpy.append(self.recording, self.fs.get_samples(int(44100 * dur)))
+                self.recording = numpy.append(self.recording, self.synth.get_samples(int(44100 * dur)))
                 self.time = time.time()
 
     def get_prediction(self, drumNumber):
-        input_data = []
-        input_data.append(self.current_gesture_x_frequencies)
-        input_data.append(self.current_gesture_y_frequencies)
-        input_data.append(self.current_gesture_z_frequencies)
-        predicition_data = self.get_svm_data_array(input_data)
-        result = self.classifier.predict(predicition_data)[0]
+        result = self.classifier.predict(self.current_gesture_x_frequencies,
+                                         self.current_gesture_y_frequencies,
+                                         self.current_gesture_z_frequencies)
+        if result is None:
+            # not trained with at least two gestures yet
+            # or not enough data
+            return "None"
         self.make_sound(result, drumNumber)
-        return list(self.training_data_dict.keys())[result]
+        return self.classifier.get_gesture_name(result)
 
     def start_recording(self):
         self.is_recording = True
@@ -105,7 +83,7 @@ class PredictNode(Node):
         print("stop recording")
 
     def get_recording(self):
-        result = fluidsynth.raw_audio_string(self.recording)
+        result = raw_audio_string(self.recording)
         self.recording = []
         return result
         
@@ -115,3 +93,20 @@ class PredictNode(Node):
         self.current_gesture_x_frequencies = kwds["accelerator_x"]
         self.current_gesture_y_frequencies = kwds["accelerator_y"]
         self.current_gesture_z_frequencies = kwds["accelerator_z"]
+
+
+# PredictNode with one (n, 3) terminal for all axes
+class PredictNode3(PredictNode):
+    nodeName = "PredictNode3"
+
+    def __init__(self, name):
+        Node.__init__(self, name, terminals={
+            "accelerator": dict(io="in")
+        })
+        self._init_state()
+
+    def process(self, **kwds):
+        frequencies = kwds["accelerator"]
+        self.current_gesture_x_frequencies = frequencies[:, 0]
+        self.current_gesture_y_frequencies = frequencies[:, 1]
+        self.current_gesture_z_frequencies = frequencies[:, 2]
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+import numpy as np
+
+'''
+Fixed size ring buffer for sensor samples.
+
+The storage is allocated once with twice the capacity and every sample
+is written to both halves. This way the last n samples are always
+a contiguous slice of the storage and window() can return a view
+instead of copying. Pushing samples does not allocate any memory.
+
+A buffer either holds scalar samples (channels=None, 1d window) or
+samples with several channels, e.g. x/y/z (channels=3, window of shape (n, 3)).
+'''
+
+
+class RingBuffer:
+
+    def __init__(self, capacity, channels=None, dtype=np.float64):
+        if capacity < 1:
+            raise ValueError("capacity has to be at least 1")
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self._capacity = int(capacity)
+        self._data = np.zeros(self._shape(self._capacity), dtype=self.dtype)
+        # index where the next sample is written (0 <= head < capacity)
+        self._head = 0
+        # number of valid samples (<= capacity)
+        self._count = 0
+        # number of samples pushed since creation
+        self._total = 0
+
+    def _shape(self, capacity):
+        if self.channels is None:
+            return (2 * capacity,)
+        return (2 * capacity, self.channels)
+
+    def __len__(self):
+        return self._count
+
+    def get_capacity(self):
+        return self._capacity
+
+    def get_total(self):
+        return self._total
+
+    def is_full(self):
+        return self._count == self._capacity
+
+    # push a single sample (scalar or one value per channel)
+    def append(self, value):
+        head = self._head
+        self._data[head] = value
+        self._data[head + self._capacity] = value
+        self._head = head + 1 if head + 1 < self._capacity else 0
+        if self._count < self._capacity:
+            self._count += 1
+        self._total += 1
+
+    # push a chunk of samples with one vectorized copy per half
+    def extend(self, values):
+        values = np.asarray(values)
+        n = len(values)
+        if n == 0:
+            return
+        if n == 1:
+            self.append(values[0])
+            return
+        capacity = self._capacity
+        self._total += n
+        if n >= capacity:
+            # only the newest samples survive
+            values = values[-capacity:]
+            self._data[:capacity] = values
+            self._data[capacity:] = values
+            self._head = 0
+            self._count = capacity
+            return
+
+        head = self._head
+        first = min(n, capacity - head)
+        self._data[head:head + first] = values[:first]
+        self._data[head + capacity:head + capacity + first] = values[:first]
+        rest = n - first
+        if rest:
+            self._data[:rest] = values[first:]
+            self._data[capacity:capacity + rest] = values[first:]
+        self._head = (head + n) % capacity
+        self._count = min(self._count + n, capacity)
+
+    # returns the last n samples (all samples if n is None) oldest first.
+    # The result is a view into the buffer and is only valid until the
+    # next call of append()/extend(); copy it if it has to be kept.
+    def window(self, n=None):
+        if n is None or n > self._count:
+            n = self._count
+        stop = self._head + self._capacity
+        return self._data[stop - n:stop]
+
+    # returns the newest sample
+    def last(self):
+        return self._data[self._head + self._capacity - 1]
+
+    # changes the capacity; the newest samples are kept
+    # (all of them if the buffer grows)
+    def resize(self, capacity):
+        capacity = int(capacity)
+        if capacity < 1:
+            raise ValueError("capacity has to be at least 1")
+        if capacity == self._capacity:
+            return
+        kept = self.window(capacity).copy()
+        self._capacity = capacity
+        self._data = np.zeros(self._shape(capacity), dtype=self.dtype)
+        self._head = 0
+        self._count = 0
+        total = self._total
+        self.extend(kept)
+        self._total = total
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
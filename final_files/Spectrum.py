@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+import numpy as np
+from RingBuffer import RingBuffer
+
+'''
+Streaming spectral analysis of multi-channel sensor samples.
+
+Stft keeps a sliding window of samples and computes the magnitude
+spectrum of all channels with one real-input FFT every hop_size samples.
+
+SlidingDft keeps the DFT bins of the window and updates them
+with a few multiply-adds per sample instead of transforming
+the whole window again.
+
+Both return the same values as the FftNode always did:
+np.abs(np.fft.fft(window) / n)[0:n // 2] per channel
+(for the rectangular window, other windows are normalized by their sum).
+'''
+
+# periodic windows, so the hann window can also be applied
+# in the frequency domain by the sliding DFT
+WINDOW_FUNCTIONS = {
+    "rect": np.ones,
+    "hann": lambda n: np.hanning(n + 1)[:-1],
+    "hamming": lambda n: np.hamming(n + 1)[:-1],
+    "blackman": lambda n: np.blackman(n + 1)[:-1],
+}
+
+# the sliding DFT is recomputed from the window every RESYNC samples
+# so floating point errors can not pile up
+RESYNC = 1024
+
+
+class Stft:
+
+    def __init__(self, length, channels, window="rect", hop_size=1):
+        if window not in WINDOW_FUNCTIONS:
+            raise ValueError(f"unknown window function: {window}")
+        self.length = length
+        self.channels = channels
+        self.window = window
+        self.hop_size = max(1, int(hop_size))
+        self._samples = RingBuffer(length, channels)
+        # window arrays per number of samples, the window is only
+        # shorter than length while the buffer fills up
+        self._window_arrays = {}
+        self._scratch = np.zeros((length, channels))
+        self._since_spectrum = 0
+        self._spectrum = np.zeros((0, channels))
+
+    def __len__(self):
+        return len(self._samples)
+
+    def _window_array(self, n):
+        window = self._window_arrays.get(n)
+        if window is None:
+            window = WINDOW_FUNCTIONS[self.window](n)
+            if window.sum() == 0:
+                window = np.ones(n)
+            # normalization by the window sum (n for the rectangular window)
+            window = (window / window.sum())[:, np.newaxis]
+            self._window_arrays[n] = window
+        return window
+
+    def append(self, sample):
+        self._samples.append(sample)
+        self._since_spectrum += 1
+
+    def extend(self, samples):
+        self._samples.extend(samples)
+        self._since_spectrum += len(samples)
+
+    # magnitude spectrum of shape (n // 2, channels) for n buffered samples.
+    # It is only recomputed every hop_size samples.
+    def spectrum(self):
+        if self._since_spectrum >= self.hop_size or len(self._spectrum) == 0:
+            self._since_spectrum = 0
+            data = self._samples.window()
+            n = len(data)
+            if n == 0:
+                return self._spectrum
+            scratch = self._scratch[:n]
+            np.multiply(data, self._window_array(n), out=scratch)
+            # one transform for all channels
+            self._spectrum = np.abs(np.fft.rfft(scratch, axis=0))[:n // 2]
+        return self._spectrum
+
+
+class SlidingDft:
+
+    def __init__(self, length, channels, window="rect", hop_size=1):
+        if window not in ("rect", "hann"):
+            raise ValueError("the sliding DFT supports 'rect' and 'hann' windows")
+        self.length = length
+        self.channels = channels
+        self.window = window
+        self.hop_size = max(1, int(hop_size))
+        # bins 0 .. length // 2, the hann window needs the neighbours
+        # of the returned bins
+        self._bins = length // 2 + 1
+        k = np.arange(self._bins)
+        self._twiddle = np.exp(2j * np.pi * k / length)[:, np.newaxis]
+        self._dft = np.zeros((self._bins, channels), dtype=complex)
+        self._diff = np.zeros(channels)
+        self._samples = RingBuffer(length, channels)
+        # used while the window fills up
+        self._stft = Stft(length, channels, window, 1)
+        self._since_resync = 0
+        self._since_spectrum = 0
+        self._spectrum = None
+
+    def __len__(self):
+        return len(self._samples)
+
+    def _resync(self):
+        self._dft[:] = np.fft.rfft(self._samples.window(), axis=0)
+        self._since_resync = 0
+
+    def append(self, sample):
+        self._since_spectrum += 1
+        if not self._samples.is_full():
+            self._samples.append(sample)
+            self._stft.append(sample)
+            if self._samples.is_full():
+                self._resync()
+            return
+
+        # X_k = (X_k + x_new - x_old) * e^(2 pi i k / N)
+        np.subtract(sample, self._samples.window()[0], out=self._diff)
+        self._samples.append(sample)
+        self._dft += self._diff
+        self._dft *= self._twiddle
+
+        self._since_resync += 1
+        if self._since_resync >= RESYNC:
+            self._resync()
+
+    def extend(self, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        if len(samples) > self.length // 8 and self._samples.is_full():
+            # for larger chunks a new transform is cheaper
+            self._samples.extend(samples)
+            self._since_spectrum += len(samples)
+            self._resync()
+            return
+        for sample in samples:
+            self.append(sample)
+
+    # magnitude spectrum of shape (n // 2, channels), see Stft.spectrum()
+    def spectrum(self):
+        if not self._samples.is_full():
+            return self._stft.spectrum()
+        if self._spectrum is not None and self._since_spectrum < self.hop_size:
+            return self._spectrum
+        self._since_spectrum = 0
+
+        n = self.length
+        dft = self._dft
+        if self.window == "hann":
+            # the (periodic) hann window in the frequency domain:
+            # 0.5 X_k - 0.25 (X_k-1 + X_k+1), with X_-1 = conj(X_1)
+            windowed = 0.5 * dft[:n // 2]
+            windowed[1:] -= 0.25 * dft[:n // 2 - 1]
+            windowed[0] -= 0.25 * np.conj(dft[1])
+            windowed -= 0.25 * dft[1:n // 2 + 1]
+            self._spectrum = np.abs(windowed) * (2 / n)
+        else:
+            self._spectrum = np.abs(dft[:n // 2]) / n
+        return self._spectrum
+
+
+class Goertzel:
+    """
+    Goertzel filters for a few selected DFT bins.
+
+    Every sample costs O(len(bins)) instead of a whole FFT.
+    The magnitudes of a block of block_length samples are available
+    when the block is complete; until the first block is, they are zero.
+    To get a new result every hop_size samples, block_length / hop_size
+    staggered filter banks run at the same time.
+    """
+
+    def __init__(self, bins, block_length, channels, hop_size=None):
+        if hop_size is None:
+            hop_size = block_length
+        if block_length % hop_size != 0:
+            raise ValueError("hop_size has to divide block_length")
+        self.bins = np.asarray(bins)
+        self.block_length = block_length
+        self.channels = channels
+        self.hop_size = hop_size
+        self._banks = block_length // hop_size
+        shape = (self._banks, len(self.bins), channels)
+        self._coeff = (2 * np.cos(2 * np.pi * self.bins / block_length))[
+            np.newaxis, :, np.newaxis]
+        self._s1 = np.zeros(shape)
+        self._s2 = np.zeros(shape)
+        self._tmp = np.zeros(shape)
+        self._power = np.zeros((len(self.bins), channels))
+        self._magnitude = np.zeros((len(self.bins), channels), dtype=np.float32)
+        self._count = 0
+
+    # push a single sample of shape (channels,)
+    # returns True if new magnitudes are available
+    def append(self, sample):
+        # s0 = x + coeff * s1 - s2, written into the s2 array
+        np.multiply(self._coeff, self._s1, out=self._tmp)
+        np.subtract(self._tmp, self._s2, out=self._s2)
+        self._s2 += sample
+        self._s1, self._s2 = self._s2, self._s1
+
+        self._count += 1
+        if self._count % self.hop_size != 0:
+            return False
+        # the bank that has seen a whole block
+        bank = (self._count // self.hop_size) % self._banks
+        s1 = self._s1[bank]
+        s2 = self._s2[bank]
+        if self._count < self.block_length:
+            # the banks start staggered, before the first whole block
+            # this one has only seen a part of it
+            s1[:] = 0
+            s2[:] = 0
+            return False
+        # |X_k|^2 = s1^2 + s2^2 - coeff * s1 * s2
+        np.multiply(s1, s1, out=self._power)
+        self._power += s2 * s2
+        self._power -= self._coeff[0] * s1 * s2
+        np.maximum(self._power, 0, out=self._power)
+        np.sqrt(self._power, out=self._power)
+        # same normalization as the FftNode
+        np.divide(self._power, self.block_length, out=self._magnitude,
+                  casting="unsafe")
+        s1[:] = 0
+        s2[:] = 0
+        return True
+
+    def extend(self, samples):
+        updated = False
+        for sample in samples:
+            updated = self.append(sample) or updated
+        return updated
+
+    # magnitudes of the selected bins, shape (len(bins), channels), float32
+    def magnitudes(self):
+        return self._magnitude
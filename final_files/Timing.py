@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+import csv
+import math
+from collections import deque
+from time import perf_counter, monotonic
+
+'''
+Timing instrumentation for nodes, pipeline stages and callbacks.
+
+Timings wraps methods of single objects (e.g. every Node.process of a
+flowchart) and records the wall time of every call into a histogram per
+name. The wrappers only exist while timing is enabled: disabled
+objects run their original methods without any overhead.
+
+    timings = Timings()
+    timings.instrument_flowchart(fc)
+    timings.instrument(prediction_node, 'get_prediction')
+    ...
+    timings.get_summary()['ConvolveNode.process']['p95']
+
+LatencyTracer follows single hits from receiving the sensor sample to
+the sound and breaks their latency down by stage.
+'''
+
+# histograms cover 1 us .. 100 s with BUCKETS_PER_DECADE buckets per
+# factor of 10 (12% wide at 20 buckets)
+SMALLEST_TIME = 1e-6
+DECADES = 8
+BUCKETS_PER_DECADE = 20
+
+
+# log-scaled histogram of durations in seconds.
+# Recording costs one log10 and one list increment.
+class LatencyHistogram():
+    def __init__(self):
+        self._buckets = [0] * (DECADES * BUCKETS_PER_DECADE + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        if seconds <= SMALLEST_TIME:
+            index = 0
+        else:
+            index = min(int(math.log10(seconds / SMALLEST_TIME) *
+                            BUCKETS_PER_DECADE) + 1, len(self._buckets) - 1)
+        self._buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    # upper bound of the bucket holding the given percentile (0 .. 100)
+    def percentile(self, percent):
+        if self.count == 0:
+            return 0.0
+        rank = percent / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self._buckets):
+            seen += count
+            if seen >= rank and count:
+                bound = SMALLEST_TIME * 10 ** (index / BUCKETS_PER_DECADE)
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count else 0.0,
+                'p50': self.percentile(50),
+                'p95': self.percentile(95),
+                'p99': self.percentile(99),
+                'max': self.max}
+
+    def reset(self):
+        self.__init__()
+
+
+class Timings():
+    def __init__(self):
+        self.histograms = {}
+        # (object, method name) of all installed wrappers
+        self._wrapped = []
+
+    def get_histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = LatencyHistogram()
+            self.histograms[name] = histogram
+        return histogram
+
+    # times every call of obj.method_name (only for this object)
+    # under name, by default "<class name>.<method name>"
+    def instrument(self, obj, method_name, name=None):
+        if name is None:
+            name = f'{type(obj).__name__}.{method_name}'
+        method = getattr(obj, method_name)
+        record = self.get_histogram(name).record
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                record(perf_counter() - start)
+
+        setattr(obj, method_name, timed)
+        self._wrapped.append((obj, method_name))
+
+    # times process() of every node of a pyqtgraph flowchart
+    def instrument_flowchart(self, flowchart):
+        for name, node in flowchart.nodes().items():
+            self.instrument(node, 'process', f'{name}.process')
+
+    # removes all wrappers, the histograms are kept
+    def uninstrument(self):
+        for obj, method_name in self._wrapped:
+            # the wrapper is an instance attribute hiding the method
+            if method_name in vars(obj):
+                delattr(obj, method_name)
+        self._wrapped = []
+
+    def is_enabled(self):
+        return len(self._wrapped) > 0
+
+    # {name: {'count', 'mean', 'p50', 'p95', 'p99', 'max'}}, times in seconds
+    def get_summary(self):
+        return {name: histogram.summary()
+                for name, histogram in self.histograms.items()}
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    # table of all histograms in milliseconds
+    def format_summary(self):
+        lines = [f'{"name":32} {"count":>8} {"p50":>8} {"p95":>8} '
+                 f'{"p99":>8} {"max":>8}']
+        for name, summary in sorted(self.get_summary().items()):
+            lines.append(f'{name:32} {summary["count"]:8d} ' + ' '.join(
+                f'{1000 * summary[key]:8.3f}'
+                for key in ('p50', 'p95', 'p99', 'max')))
+        return '\n'.join(lines)
+
+
+# number of finished traces a LatencyTracer keeps
+TRACE_LIMIT = 10000
+
+
+# Motion-to-sound latency of single hits.
+# The trace of a device starts with the first sample batch after the
+# previous prediction: the index of its first sample in the sensor
+# history (trace id) and the monotonic time it was received. A motion
+# in this sample waits longest for the next prediction. The stages the
+# batch passes add their monotonic time (later batches do not change
+# it). A prediction takes the trace as the pending trace of the device;
+# if the prediction plays a sound it is finished and kept, otherwise
+# dropped.
+class LatencyTracer():
+    def __init__(self, limit=TRACE_LIMIT):
+        self.traces = deque(maxlen=limit)
+        self._current = {}
+        self._pending = {}
+        self._wrapped = []
+
+    # does nothing while the device has a trace not taken by a prediction
+    def begin(self, key, trace_id, receive_time):
+        if key not in self._current:
+            self._current[key] = {'device': key, 'trace_id': trace_id,
+                                  'receive': receive_time}
+
+    def mark(self, key, stage):
+        trace = self._current.get(key)
+        if trace is not None and stage not in trace:
+            trace[stage] = monotonic()
+
+    # a prediction starts with the current trace of the device
+    def snapshot(self, key):
+        self._pending[key] = self._current.pop(key, None)
+
+    def mark_pending(self, key, stage):
+        trace = self._pending.get(key)
+        if trace is not None:
+            trace[stage] = monotonic()
+
+    # the pending trace ended with a sound
+    def finish(self, key):
+        trace = self._pending.pop(key, None)
+        if trace is not None:
+            self.traces.append(trace)
+
+    def discard(self, key):
+        self._pending.pop(key, None)
+
+    # calls before(*args) and after(result, *args) around every call of
+    # obj.method_name, removed again by unwrap()
+    def wrap(self, obj, method_name, before=None, after=None):
+        method = getattr(obj, method_name)
+
+        def traced(*args, **kwargs):
+            if before is not None:
+                before(*args)
+            result = method(*args, **kwargs)
+            if after is not None:
+                after(result, *args)
+            return result
+
+        setattr(obj, method_name, traced)
+        self._wrapped.append((obj, method_name))
+
+    def unwrap(self):
+        for obj, method_name in self._wrapped:
+            if method_name in vars(obj):
+                delattr(obj, method_name)
+        self._wrapped = []
+
+    # names of all stages in the order they were passed
+    def get_stages(self):
+        stages = []
+        for trace in self.traces:
+            for stage in trace:
+                if stage not in ('device', 'trace_id', 'receive') and \
+                        stage not in stages:
+                    stages.append(stage)
+        return stages
+
+    # per hit: device, trace id and the milliseconds every stage took
+    # since the previous one (the first since receiving), plus the total
+    def get_breakdowns(self):
+        breakdowns = []
+        for trace in self.traces:
+            breakdown = {'device': trace['device'],
+                         'trace_id': trace['trace_id']}
+            previous = trace['receive']
+            for stage, time in trace.items():
+                if stage in ('device', 'trace_id', 'receive'):
+                    continue
+                breakdown[stage] = 1000 * (time - previous)
+                previous = time
+            breakdown['total'] = 1000 * (previous - trace['receive'])
+            breakdowns.append(breakdown)
+        return breakdowns
+
+    # median milliseconds per stage and in total
+    def get_medians(self):
+        breakdowns = self.get_breakdowns()
+        medians = {}
+        for stage in self.get_stages() + ['total']:
+            values = sorted(b[stage] for b in breakdowns if stage in b)
+            if values:
+                medians[stage] = values[len(values) // 2]
+        return medians
+
+    # writes the breakdowns of all hits as csv
+    def export_csv(self, path):
+        columns = ['device', 'trace_id'] + self.get_stages() + ['total']
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+            for breakdown in self.get_breakdowns():
+                writer.writerow(breakdown)
+        return len(self.traces)
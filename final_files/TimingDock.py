@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+from PyQt5 import QtCore, QtWidgets
+
+# milliseconds between two updates of the table
+REFRESH_INTERVAL = 1000
+COLUMNS = ('count', 'p50', 'p95', 'p99', 'max')
+
+
+# dock widget with a live table of the histograms of a Timings object
+class TimingDock(QtWidgets.QDockWidget):
+    def __init__(self, timings, parent=None):
+        super(TimingDock, self).__init__("Timing (ms)", parent)
+        self.timings = timings
+        self.table = QtWidgets.QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.setWidget(self.table)
+
+        self.refresh_timer = QtCore.QTimer()
+        self.refresh_timer.timeout.connect(lambda: self.refresh())
+        self.refresh_timer.start(REFRESH_INTERVAL)
+
+    def refresh(self):
+        summary = sorted(self.timings.get_summary().items())
+        self.table.setRowCount(len(summary))
+        self.table.setVerticalHeaderLabels([name for name, values in summary])
+        for row, (name, values) in enumerate(summary):
+            for column, key in enumerate(COLUMNS):
+                if key == 'count':
+                    text = str(values[key])
+                else:
+                    text = f'{1000 * values[key]:.3f}'
+                self.table.setItem(row, column, QtWidgets.QTableWidgetItem(text))
@@ -4,6 +4,7 @@
 # Script was written by Erik Blank and Michael Schmidt
 
 from pyqtgraph.flowchart import Node
+from GestureStore import WindowCapture
 
 
 class TrainNode(Node):
@@ -15,10 +16,27 @@ class TrainNode(Node):
             "accelerator_y": dict(io="in"),
             "accelerator_z": dict(io="in")
         })
+        self._init_state()
+
+    def _init_state(self):
         self.isRecording = False
         self.current_gesture_x_frequencies = []
         self.current_gesture_y_frequencies = []
         self.current_gesture_z_frequencies = []
+        # WindowCapture collecting every window while capturing
+        self.capture = None
+
+    # from now on every new window is added to capture (a new
+    # WindowCapture by default) until stop_capture()
+    def start_capture(self, capture=None):
+        self.capture = capture if capture is not None else WindowCapture()
+        self.capture.clear()
+        return self.capture
+
+    def stop_capture(self):
+        capture = self.capture
+        self.capture = None
+        return capture
 
     def get_current_frequencies_as_string(self, seperator):
         current_frequency_strings = []
@@ -30,8 +48,37 @@ class TrainNode(Node):
             map(str, self.current_gesture_z_frequencies)))
         return current_frequency_strings
 
+    # appends the current frequencies as gesture name to a GestureStore
+    def save_gesture(self, store, name):
+        return store.append(name, self.current_gesture_x_frequencies,
+                            self.current_gesture_y_frequencies,
+                            self.current_gesture_z_frequencies)
+
     def process(self, **kwds):
         # Get the last values from our accelerator data
         self.current_gesture_x_frequencies = kwds["accelerator_x"]
         self.current_gesture_y_frequencies = kwds["accelerator_y"]
         self.current_gesture_z_frequencies = kwds["accelerator_z"]
+        if self.capture is not None:
+            self.capture.add(self.current_gesture_x_frequencies,
+                             self.current_gesture_y_frequencies,
+                             self.current_gesture_z_frequencies)
+
+
+# TrainNode with one (n, 3) terminal for all axes
+class TrainNode3(TrainNode):
+    nodeName = "TrainNode3"
+
+    def __init__(self, name):
+        Node.__init__(self, name, terminals={
+            "accelerator": dict(io="in")
+        })
+        self._init_state()
+
+    def process(self, **kwds):
+        frequencies = kwds["accelerator"]
+        self.current_gesture_x_frequencies = frequencies[:, 0]
+        self.current_gesture_y_frequencies = frequencies[:, 1]
+        self.current_gesture_z_frequencies = frequencies[:, 2]
+        if self.capture is not None:
+            self.capture.add_window(frequencies)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+import json
+import random
+import sys
+from time import perf_counter
+from DIPPID import Sensor, encode_binary_packet
+
+'''
+Microbenchmark for Sensor._update, the per-packet work of the receive thread.
+Decodes the same synthetic DIPPID packets with the original
+implementation (BaselineSensor), the generic and the fast (schema)
+decode path and as binary packets and prints packets per second.
+
+JSON packets are decoded slower than by the original implementation
+(about 0.65x generic, 0.8x fast decode): every sample is also written
+into the sample history, which the original did not keep, and that
+costs more than the original's whole per-packet loop after json.loads.
+Only binary packets are faster (about 1.7x).
+
+usage: python bench_dippid_decode.py [PACKETS]
+'''
+
+
+# Sensor._update as it was before any of the optimizations:
+# a list of capabilities and no sample history
+class BaselineSensor():
+    def __init__(self):
+        self._capabilities = []
+        self._callbacks = {}
+        self._data = {}
+
+    def _update(self, data):
+        try:
+            data_json = json.loads(data)
+        except json.decoder.JSONDecodeError:
+            # incomplete data
+            return
+
+        for key, value in data_json.items():
+            self._add_capability(key)
+
+            # do not notify callbacks on initialization
+            if self._data[key] == []:
+                self._data[key] = value
+                continue
+
+            # notify callbacks only if data has changed
+            if self._data[key] != value:
+                self._data[key] = value
+                self._notify_callbacks(key)
+
+    def has_capability(self, key):
+        return key in self._capabilities
+
+    def _add_capability(self, key):
+        if not self.has_capability(key):
+            self._capabilities.append(key)
+            self._callbacks[key] = []
+            self._data[key] = []
+
+    def register_callback(self, key, func):
+        self._add_capability(key)
+        self._callbacks[key].append(func)
+
+    def _notify_callbacks(self, key):
+        for func in self._callbacks[key]:
+            func(self._data[key])
+
+
+def make_packets(count):
+    packets = []
+    for i in range(count):
+        packets.append(json.dumps({
+            "accelerometer": {"x": random.uniform(-1, 1),
+                              "y": random.uniform(-1, 1),
+                              "z": random.uniform(-1, 1)},
+            "gyroscope": {"x": random.uniform(-1, 1),
+                          "y": random.uniform(-1, 1),
+                          "z": random.uniform(-1, 1)},
+            "button_1": int(i % 50 == 0),
+            "button_2": 0,
+            "button_3": 0,
+        }))
+    return packets
+
+
+def make_binary_packets(count):
+    return [encode_binary_packet(i, i / 100,
+                                 [random.uniform(-1, 1) for axis in range(3)],
+                                 [i % 50 == 0, 0, 0])
+            for i in range(count)]
+
+
+def baseline_packets_per_second(packets):
+    sensor = BaselineSensor()
+    sensor.register_callback('accelerometer', lambda value: None)
+    start = perf_counter()
+    for packet in packets:
+        sensor._update(packet)
+    return len(packets) / (perf_counter() - start)
+
+
+def packets_per_second(packets, fast_decode):
+    sensor = Sensor()
+    sensor.fast_decode = fast_decode
+    sensor.register_callback('accelerometer', lambda value: None)
+    start = perf_counter()
+    if isinstance(packets[0], bytes):
+        for packet in packets:
+            sensor._receive_datagram(packet)
+    else:
+        for packet in packets:
+            sensor._update(packet)
+    duration = perf_counter() - start
+    Sensor.instances.remove(sensor)
+    return len(packets) / duration
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    packets = make_packets(count)
+    binary_packets = make_binary_packets(count)
+    # warm up
+    baseline_packets_per_second(packets[:1000])
+    packets_per_second(packets[:1000], False)
+    packets_per_second(packets[:1000], True)
+
+    baseline = baseline_packets_per_second(packets)
+    generic = packets_per_second(packets, False)
+    fast = packets_per_second(packets, True)
+    binary = packets_per_second(binary_packets, True)
+    print(f'baseline:       {baseline:10.0f} packets/s')
+    print(f'generic decode: {generic:10.0f} packets/s ({generic / baseline:.2f}x)')
+    print(f'fast decode:    {fast:10.0f} packets/s ({fast / baseline:.2f}x)')
+    print(f'binary packets: {binary:10.0f} packets/s ({binary / baseline:.2f}x)')
+    if max(generic, fast) < baseline:
+        print('JSON decoding is slower than the baseline, '
+              'it also writes every sample into the history; '
+              'send binary packets for more throughput')
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# -*- coding: utf-8 -*-
+# Script was written by Erik Blank and Michael Schmidt
+
+import argparse
+import heapq
+import json
+import math
+import random
+import socket
+import threading
+from time import sleep, monotonic
+from DIPPID import encode_binary_packet
+from Pipeline import Pipeline, SensorStage, drumkit_graph, TRAINING_DATA_FILE
+
+'''
+Synthetic load for the DIPPID receivers.
+
+Simulates any number of DIPPID devices that send accelerometer and
+button packets to consecutive UDP ports, e.g. 20 devices at 100 Hz:
+
+    python load_generator.py --devices 20 --rate 100 --port 5700
+
+Idle devices send gravity with a little noise, now and then they perform
+a hit (a short spike on the z axis while button_1 is pressed).
+All devices are simulated by one thread, so the generator itself scales
+far beyond the receivers.
+
+With --receive the packets are also received and processed in this
+process: a Pipeline runs the drumkit chain (convolution, classification
+and muted sound) for every port, and every second the number of
+delivered (sent and not dropped), processed (read by the pipeline)
+and lost samples (overwritten before the pipeline read them) are
+printed. If processed falls behind delivered the receivers or the
+pipeline are saturated.
+'''
+
+GRAVITY = 1.0
+IDLE_NOISE = 0.02
+# a hit is half a sine period of HIT_AMPLITUDE on the z axis
+HIT_AMPLITUDE = 2.5
+HIT_DURATION = 0.12
+
+
+# one simulated device sending to one port
+class SimulatedDevice():
+    def __init__(self, port, rate, jitter=0, loss=0, hit_rate=0.5,
+                 binary=False, seed=None):
+        self.port = port
+        self.rate = rate
+        self.jitter = jitter
+        self.loss = loss
+        self.hit_rate = hit_rate
+        self.binary = binary
+        self.sent = 0
+        self.dropped = 0
+        self._random = random.Random(seed)
+        self._sequence = 0
+        self._start = monotonic()
+        self._hit_start = None
+        self._next_hit = self._start + self._random.expovariate(hit_rate) \
+            if hit_rate > 0 else math.inf
+
+    # seconds until the next packet
+    def interval(self):
+        interval = 1 / self.rate
+        if self.jitter:
+            interval += self._random.uniform(-self.jitter, self.jitter)
+        return max(interval, 0)
+
+    # accelerometer sample and button_1 state at time now
+    def sample(self, now):
+        noise = self._random.gauss
+        x = noise(0, IDLE_NOISE)
+        y = noise(0, IDLE_NOISE)
+        z = GRAVITY + noise(0, IDLE_NOISE)
+        button = 0
+
+        if self._hit_start is None and now >= self._next_hit:
+            self._hit_start = now
+        if self._hit_start is not None:
+            phase = (now - self._hit_start) / HIT_DURATION
+            if phase < 1:
+                z += HIT_AMPLITUDE * math.sin(math.pi * phase)
+                button = 1
+            else:
+                self._hit_start = None
+                self._next_hit = now + self._random.expovariate(self.hit_rate)
+        return (x, y, z), button
+
+    def packet(self, now):
+        (x, y, z), button = self.sample(now)
+        self._sequence += 1
+        if self.binary:
+            return encode_binary_packet(self._sequence, now - self._start,
+                                        (x, y, z), (button, 0, 0))
+        return json.dumps({
+            'accelerometer': {'x': x, 'y': y, 'z': z},
+            'button_1': button,
+            'button_2': 0,
+            'button_3': 0,
+        }).encode()
+
+    # sends the next packet, or drops it with probability loss
+    # (the sequence number still advances, like on a lossy network)
+    def send(self, sock, host, now):
+        data = self.packet(now)
+        if self.loss and self._random.random() < self.loss:
+            self.dropped += 1
+            return
+        sock.sendto(data, (host, self.port))
+        self.sent += 1
+
+
+# sends the packets of all devices from one thread
+class LoadGenerator():
+    def __init__(self, devices, host='127.0.0.1'):
+        self.devices = devices
+        self.host = host
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        now = monotonic()
+        # (time of the next packet, device index)
+        self._schedule = [(now, i) for i in range(len(devices))]
+        heapq.heapify(self._schedule)
+
+    def get_sent(self):
+        return sum(device.sent for device in self.devices)
+
+    def get_dropped(self):
+        return sum(device.dropped for device in self.devices)
+
+    # sends all packets that are due until time end
+    def run_until(self, end):
+        while True:
+            due, index = self._schedule[0]
+            if due >= end:
+                return
+            delay = due - monotonic()
+            if delay > 0:
+                sleep(delay)
+            device = self.devices[index]
+            device.send(self._sock, self.host, due)
+            heapq.heapreplace(self._schedule, (due + device.interval(), index))
+
+
+# the drumkit pipeline of every port, with muted sound
+def create_pipeline(ports, training_data=TRAINING_DATA_FILE, multiplexed=True):
+    graph = drumkit_graph(ports, training_data, mute=True)
+    for i in range(len(ports)):
+        graph[f'device{i}']['multiplexed'] = multiplexed
+    return Pipeline(graph)
+
+
+# (received, processed, lost) samples of all sensor stages of pipeline
+def get_counts(pipeline):
+    sensors = [stage for stage in pipeline.stages.values()
+               if isinstance(stage, SensorStage)]
+    received = sum(stage.sensor.get_cursor('accelerometer')
+                   for stage in sensors)
+    processed = sum(stage.samples for stage in sensors)
+    lost = sum(stage.lost for stage in sensors)
+    return received, processed, lost
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='simulates DIPPID devices sending to UDP ports')
+    parser.add_argument('--devices', type=int, default=2)
+    parser.add_argument('--port', type=int, default=5700,
+                        help='port of the first device, one port per device')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--rate', type=float, default=100,
+                        help='packets per second and device')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='random deviation of the send interval in seconds')
+    parser.add_argument('--loss', type=float, default=0,
+                        help='probability that a packet is dropped')
+    parser.add_argument('--hit-rate', type=float, default=0.5,
+                        help='hits per second and device, 0 keeps devices idle')
+    parser.add_argument('--binary', action='store_true',
+                        help='send binary instead of JSON packets')
+    parser.add_argument('--duration', type=float, default=math.inf,
+                        help='seconds to run, default until ctrl+c')
+    parser.add_argument('--receive', action='store_true',
+                        help='receive and process in this process and '
+                        'report processed samples')
+    parser.add_argument('--training-data', default=TRAINING_DATA_FILE,
+                        help='with --receive: training data of the classifiers')
+    parser.add_argument('--threads', action='store_true',
+                        help='with --receive: one thread per device '
+                        'instead of the shared receive thread')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    ports = [args.port + i for i in range(args.devices)]
+    seed = random.Random(args.seed)
+    devices = [SimulatedDevice(port, args.rate, args.jitter, args.loss,
+                               args.hit_rate, args.binary, seed.random())
+               for port in ports]
+    pipeline = None
+    if args.receive:
+        pipeline = create_pipeline(ports, args.training_data, not args.threads)
+        runner = threading.Thread(target=pipeline.run, daemon=True)
+        runner.start()
+    generator = LoadGenerator(devices, args.host)
+
+    start = monotonic()
+    end = start + args.duration
+    last = start
+    last_delivered = last_processed = 0
+    while last < end:
+        generator.run_until(min(end, last + 1))
+        now = monotonic()
+        seconds = now - last
+        delivered = generator.get_sent()
+        line = (f'{now - start:6.1f}s delivered '
+                f'{(delivered - last_delivered) / seconds:8.0f}/s'
+                f' dropped {generator.get_dropped():7d}')
+        if pipeline is not None:
+            received, processed, lost = get_counts(pipeline)
+            line += (f' processed {(processed - last_processed) / seconds:8.0f}/s'
+                     f' behind {delivered - processed - lost:7d}'
+                     f' lost {lost:7d}')
+            last_processed = processed
+        print(line)
+        last = now
+        last_delivered = delivered
+
+    if pipeline is not None:
+        # give the receivers and the pipeline time for the last packets
+        sleep(0.5)
+        pipeline.stop()
+        # the stages are only closed once the last step is done
+        runner.join()
+        delivered = generator.get_sent()
+        received, processed, lost = get_counts(pipeline)
+        print(f'total delivered {delivered} processed {processed} '
+              f'({100 * processed / max(delivered, 1):.1f}%) '
+              f'lost {lost} in the history, {delivered - received} '
+              f'not received')
+        pipeline.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,25 +3,32 @@
 # -*- coding: utf-8 -*-
 # Script was written by Erik Blank and Michael Schmidt
 
+import argparse
 import sys
 from PyQt5 import uic, QtGui, QtCore, QtWidgets
 from PyQt5.QtWidgets import QMainWindow
 from pyqtgraph.flowchart import Flowchart, Node
-from DIPPID_pyqtnode import DIPPIDNode, BufferNode
+from DIPPID_pyqtnode import DIPPIDNode
 import pyqtgraph.flowchart.library as fclib
-import pandas as pd
 import os
-from numpy import fromstring
 import time
-from ConvolutionNode import ConvolveNode
-from TrainingNode import TrainNode
-from PredictionNode import PredictNode
+from ConvolutionNode import ConvolveNode, ConvolveNode3
+from TrainingNode import TrainNode, TrainNode3
+from PredictionNode import PredictNode, PredictNode3
 from RecordAudio import RecordAudio
+from Timing import Timings, LatencyTracer
+from GestureStore import GestureStore, import_csv
+from GestureClassifier import get_data_directory
 import fluidsynth
 import numpy
 
-# Filename where our gestures are saved
+# Directory of the GestureStore where our gestures are saved,
+# in the data directory (see GestureClassifier.get_data_directory)
+TRAINING_DATA_STORE = "training_data"
+# Filename of the old csv training data, imported into a new store
 TRAINING_DATA_FILE = "training_data.csv"
+# Filename of the latency breakdowns written with --trace
+TRACE_FILE = "latency_trace.csv"
 
 # The amount of transformed signals from the dippid we use for 1 gesture;
 # the transfomation cuts the dippid signal amount in half
@@ -57,17 +64,25 @@ class Drumkit(QtWidgets.QMainWindow):
         self.current_drum_device1 = 35
         self.recorder = RecordAudio()
         self.initUI()
-        self.init_logger(TRAINING_DATA_FILE)
+        self.init_logger(
+            os.path.join(get_data_directory(), TRAINING_DATA_STORE))
         self.init_nodes()
+        # loads the cached models, so playing starts without training
+        self.update_prediction_node_data()
         self.is_predicting0 = False
         self.prediction_timer0 = QtCore.QTimer()
-        self.prediction_timer0.timeout.connect(self.update_prediction_device0)
+        # lambdas, so the timing wrappers of enable_timing() are called
+        self.prediction_timer0.timeout.connect(
+            lambda: self.update_prediction_device0())
         self.is_predicting1 = False
         self.prediction_timer1 = QtCore.QTimer()
-        self.prediction_timer1.timeout.connect(self.update_prediction_device1)
+        self.prediction_timer1.timeout.connect(
+            lambda: self.update_prediction_device1())
         self.gesture_list = []
         self.current_training_data_dict = {}
         self.connectButtons()
+        self.timings = None
+        self.tracer = None
 
     def initUI(self):
         # create DIPPID nodes
@@ -115,20 +130,82 @@ class Drumkit(QtWidgets.QMainWindow):
         self.device2_btn_labels.append(self.ui.label_btnDevice2_3)
 
         # create Train node
-        self.train_node0 = self.fc.createNode("TrainNode", pos=(450, 150))
-        self.train_node1 = self.fc.createNode("TrainNode", pos=(450, 300))
+        self.train_node0 = self.fc.createNode("TrainNode3", pos=(450, 150))
+        self.train_node1 = self.fc.createNode("TrainNode3", pos=(450, 300))
 
         # create Prediction node
         self.prediction_node0 = self.fc.createNode(
-            "PredictNode", pos=(450, 150))
+            "PredictNode3", pos=(450, 150))
         self.prediction_node1 = self.fc.createNode(
-            "PredictNode", pos=(450, 300))
+            "PredictNode3", pos=(450, 300))
         # create FFT node
-        self.convolveNode0 = self.fc.createNode("ConvolveNode", pos=(300, 150))
-        self.convolveNode1 = self.fc.createNode("ConvolveNode", pos=(300, 300))
+        self.convolveNode0 = self.fc.createNode("ConvolveNode3", pos=(300, 150))
+        self.convolveNode1 = self.fc.createNode("ConvolveNode3", pos=(300, 300))
 
         self.show()
 
+    # records the time of every node, prediction, SVM call and sound
+    # and shows percentiles in a dock widget; without this call
+    # nothing is measured
+    def enable_timing(self):
+        from TimingDock import TimingDock
+
+        self.timings = Timings()
+        self.timings.instrument_flowchart(self.fc)
+        self.timings.instrument(self, 'update_prediction_device0')
+        self.timings.instrument(self, 'update_prediction_device1')
+        for node in (self.prediction_node0, self.prediction_node1):
+            self.timings.instrument(node, 'get_prediction',
+                                    f'{node.name()}.get_prediction')
+            self.timings.instrument(node.classifier, 'predict',
+                                    f'{node.name()}.svm_predict')
+        self.timings.instrument(PredictNode.synth, 'play', 'fluidsynth.play')
+        self.timing_dock = TimingDock(self.timings, self)
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.timing_dock)
+
+    # traces every hit from receiving the first sample after the previous
+    # prediction to the sound: propagation by the DIPPID node,
+    # convolution, waiting for the prediction timer, SVM and fluidsynth
+    def enable_tracing(self):
+        self.tracer = LatencyTracer()
+        devices = ((self.dippid_node0, self.convolveNode0, self.prediction_node0),
+                   (self.dippid_node1, self.convolveNode1, self.prediction_node1))
+        for i, (dippid_node, convolve_node, prediction_node) in enumerate(devices):
+            self._trace_device(f'device{i}', dippid_node, convolve_node,
+                               prediction_node)
+
+    def _trace_device(self, key, dippid_node, convolve_node, prediction_node):
+        tracer = self.tracer
+
+        def propagated(result):
+            trace_id, receive_time = dippid_node.get_trace()
+            if receive_time is not None:
+                tracer.begin(key, trace_id, receive_time)
+                tracer.mark(key, 'propagate')
+
+        def sound(result, gesture, drum):
+            if gesture > 0:
+                tracer.mark_pending(key, 'sound')
+                tracer.finish(key)
+
+        tracer.wrap(dippid_node, 'process', after=propagated)
+        tracer.wrap(convolve_node, 'process',
+                    after=lambda result: tracer.mark(key, 'convolve'))
+        tracer.wrap(prediction_node, 'get_prediction',
+                    before=lambda drum: (tracer.snapshot(key), tracer.mark_pending(
+                        key, 'prediction_timer')),
+                    after=lambda result, drum: tracer.discard(key))
+        tracer.wrap(prediction_node.classifier, 'predict',
+                    after=lambda result, x, y, z: tracer.mark_pending(key, 'svm'))
+        tracer.wrap(prediction_node, 'make_sound', after=sound)
+
+    # writes the latency breakdown of every traced hit as csv
+    def export_trace(self, path):
+        count = self.tracer.export_csv(path)
+        print(f'{count} hits traced to {path}')
+        for stage, median in self.tracer.get_medians().items():
+            print(f'{stage:20} {median:8.3f} ms (median)')
+
     def connectButtons(self):
         # buttons to connect devices
         self.ui.btnConnect0.clicked.connect(lambda x: self.__connectDevice1())
@@ -154,7 +231,7 @@ class Drumkit(QtWidgets.QMainWindow):
             lambda x: self.predict_button_press_device1())
 
     def __connectDevice1(self):
-        port = int(self.ui.lineEditPort0.text())
+        port = self.ui.lineEditPort0.text()
         hz = int(self.ui.lineEditConnect0.text())
         print(f'connect device 1 with {hz}hz')
         self.dippid_node0.connect_device(port, hz)
@@ -162,7 +239,7 @@ class Drumkit(QtWidgets.QMainWindow):
         self.btnConnect0.setDisabled(True)
 
     def __connectDevice2(self):
-        port = int(self.ui.lineEditPort1.text())
+        port = self.ui.lineEditPort1.text()
         hz = int(self.ui.lineEditConnect1.text())
         print(f'connect device 2 with {hz}hz')
         self.dippid_node1.connect_device(port, hz)
@@ -292,93 +369,41 @@ class Drumkit(QtWidgets.QMainWindow):
         self.handle_btns_device1(self.dippid_node1.get_btns())
         self.prediction_node1.get_prediction(self.current_drum_device1)
 
-    def init_logger(self, filename):
-        self.current_filename = filename
-        if os.path.isfile(filename):
-            self.gesture_data = pd.read_csv(filename)
+    def init_logger(self, path):
+        self.current_filename = path
+        if not os.path.isdir(path) and os.path.isfile(TRAINING_DATA_FILE):
+            self.gesture_store = import_csv(TRAINING_DATA_FILE, path)
         else:
-            self.gesture_data = pd.DataFrame(
-                columns=['gestureName', 'frequenciesX', 'frequenciesY', 'frequenciesZ'])
+            self.gesture_store = GestureStore(path, DATA_LENGTH)
 
+    # trains with every stored example, not only one per gesture
     def update_prediction_node_data(self):
-        self.current_training_data_dict = {}
-        for index, row in self.gesture_data.iterrows():
-            gesture_name = row[0]
-            gesture_x_frequencies = fromstring(row[1], sep="|")
-            gesture_y_frequencies = fromstring(row[2], sep="|")
-            gesture_z_frequencies = fromstring(row[3], sep="|")
-            self.current_training_data_dict[gesture_name] = {
-                "x": gesture_x_frequencies, "y": gesture_y_frequencies, "z": gesture_z_frequencies}
-        self.prediction_node0.init_svm_with_data(
-            self.current_training_data_dict)
-        self.prediction_node1.init_svm_with_data(
-            self.current_training_data_dict)
+        examples = self.gesture_store.get_examples()
+        self.prediction_node0.init_svm_with_examples(*examples)
+        self.prediction_node1.init_svm_with_examples(*examples)
 
     def init_nodes(self):
-        # create buffer nodes
-        buffer_node_x0 = self.fc.createNode("Buffer", pos=(150, 0))
-        buffer_node_y0 = self.fc.createNode("Buffer", pos=(150, 150))
-        buffer_node_z0 = self.fc.createNode("Buffer", pos=(150, 300))
-
-        buffer_node_x1 = self.fc.createNode("Buffer", pos=(150, 450))
-        buffer_node_y1 = self.fc.createNode("Buffer", pos=(150, 600))
-        buffer_node_z1 = self.fc.createNode("Buffer", pos=(150, 750))
+        # every terminal carries all three axes as one (n, 3) array,
+        # so each device needs a single chain of nodes
 
-        # connect buffer nodes
-        self.fc.connectTerminals(
-            self.dippid_node0["accelX"], buffer_node_x0["dataIn"])
-        self.fc.connectTerminals(
-            self.dippid_node0["accelY"], buffer_node_y0["dataIn"])
-        self.fc.connectTerminals(
-            self.dippid_node0["accelZ"], buffer_node_z0["dataIn"])
+        # connect convolution node; it gets the chunks of new samples
+        # directly and keeps its own window, so no Buffer node is needed
         self.fc.connectTerminals(
-            self.dippid_node1["accelX"], buffer_node_x1["dataIn"])
+            self.dippid_node0["accel"], self.convolveNode0["accel"])
         self.fc.connectTerminals(
-            self.dippid_node1["accelY"], buffer_node_y1["dataIn"])
-        self.fc.connectTerminals(
-            self.dippid_node1["accelZ"], buffer_node_z1["dataIn"])
-
-        # connect convolution node
-        self.fc.connectTerminals(
-            buffer_node_x0["dataOut"], self.convolveNode0["accelX"])
-        self.fc.connectTerminals(
-            buffer_node_y0["dataOut"], self.convolveNode0["accelY"])
-        self.fc.connectTerminals(
-            buffer_node_z0["dataOut"], self.convolveNode0["accelZ"])
-        self.fc.connectTerminals(
-            buffer_node_x1["dataOut"], self.convolveNode1["accelX"])
-        self.fc.connectTerminals(
-            buffer_node_y1["dataOut"], self.convolveNode1["accelY"])
-        self.fc.connectTerminals(
-            buffer_node_z1["dataOut"], self.convolveNode1["accelZ"])
+            self.dippid_node1["accel"], self.convolveNode1["accel"])
 
         # connect train node to accelerator values
         self.fc.connectTerminals(
-            self.train_node0["accelerator_x"], self.convolveNode0["frequencyX"])
-        self.fc.connectTerminals(
-            self.train_node0["accelerator_y"], self.convolveNode0["frequencyY"])
-        self.fc.connectTerminals(
-            self.train_node0["accelerator_z"], self.convolveNode0["frequencyZ"])
-        self.fc.connectTerminals(
-            self.train_node1["accelerator_x"], self.convolveNode1["frequencyX"])
-        self.fc.connectTerminals(
-            self.train_node1["accelerator_y"], self.convolveNode1["frequencyY"])
+            self.train_node0["accelerator"], self.convolveNode0["frequency"])
         self.fc.connectTerminals(
-            self.train_node1["accelerator_z"], self.convolveNode1["frequencyZ"])
+            self.train_node1["accelerator"], self.convolveNode1["frequency"])
 
         # connect prediction nodes to accelerator values
         self.fc.connectTerminals(
-            self.prediction_node0["accelerator_x"], self.convolveNode0["frequencyX"])
+            self.prediction_node0["accelerator"], self.convolveNode0["frequency"])
         self.fc.connectTerminals(
-            self.prediction_node0["accelerator_y"], self.convolveNode0["frequencyY"])
-        self.fc.connectTerminals(
-            self.prediction_node0["accelerator_z"], self.convolveNode0["frequencyZ"])
-        self.fc.connectTerminals(
-            self.prediction_node1["accelerator_x"], self.convolveNode1["frequencyX"])
-        self.fc.connectTerminals(
-            self.prediction_node1["accelerator_y"], self.convolveNode1["frequencyY"])
-        self.fc.connectTerminals(
-            self.prediction_node1["accelerator_z"], self.convolveNode1["frequencyZ"])
+            self.prediction_node1["accelerator"], self.convolveNode1["frequency"])
 
     def get_selected_drum(self, device_num, btn_num):
         if device_num == 1:
@@ -409,12 +434,31 @@ class Drumkit(QtWidgets.QMainWindow):
 fclib.registerNodeType(ConvolveNode, [("ConvolveNode",)])
 fclib.registerNodeType(TrainNode, [("TrainingNode",)])
 fclib.registerNodeType(PredictNode, [("PredictionNode",)])
+fclib.registerNodeType(ConvolveNode3, [("ConvolveNode",)])
+fclib.registerNodeType(TrainNode3, [("TrainingNode",)])
+fclib.registerNodeType(PredictNode3, [("PredictionNode",)])
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='drumkit demo')
+    parser.add_argument('--timing', action='store_true',
+                        help='show the timing of all nodes')
+    parser.add_argument('--trace', nargs='?', const=TRACE_FILE,
+                        metavar='FILE',
+                        help='write the latency breakdown of every hit '
+                        f'when the window is closed (default: {TRACE_FILE})')
+    args = parser.parse_args()
+
     app = QtWidgets.QApplication([])
     win = Drumkit()
+    if args.timing:
+        win.enable_timing()
+    if args.trace:
+        win.enable_tracing()
 
     win.show()
     if (sys.flags.interactive != 1) or not hasattr(QtCore, "PYQT_VERSION"):
-        sys.exit(app.exec_())
+        status = app.exec_()
+        if win.tracer is not None:
+            win.export_trace(args.trace)
+        sys.exit(status)